@@ -0,0 +1,55 @@
+# Compares the indexed projection lookups against the boolean masks they replaced.
+# Run from the repository root: python -m benchmarks.projections_index
+import timeit
+
+import pandas as pd
+
+from projections.utils import read_projections, build_projection_store
+
+def mask_location(df, country, province):
+    return df.loc[(df.Province == province) & (df.Country == country)]
+
+def mask_map(df, continent, day):
+    df = df.loc[df.Continent == continent]
+    df = df.loc[df['Day'] == day]
+    df = df.loc[df['Province'] == 'None']
+    return df.loc[df['Country'] != 'None']
+
+def mask_stat(df, continent, day):
+    df = df.loc[(df.Continent == continent) & (df.Country == 'None')]
+    return df.loc[df['Day'] == day]
+
+def index_location(store, country, province):
+    location = (store['continents'][(country, province)], country, province)
+    return store['df'].iloc[store['locations'][location]]
+
+def index_map(store, continent, day):
+    return store['df'].iloc[store['maps'][(continent, day)]]
+
+def index_stat(store, continent, day):
+    rows = store['locations'][(continent, 'None', 'None')]
+    i = rows.start + store['days'][rows].searchsorted(day.to_datetime64())
+    return store['df'].iloc[i]
+
+def report(name, mask_fn, index_fn, number=200):
+    mask_time = min(timeit.repeat(mask_fn, number=number, repeat=5)) / number
+    index_time = min(timeit.repeat(index_fn, number=number, repeat=5)) / number
+    print('{:<28} mask {:>9.1f} us   index {:>9.1f} us   x{:.0f}'.format(
+        name, 1e6*mask_time, 1e6*index_time, mask_time/index_time))
+
+def main():
+    build_time = timeit.timeit(lambda: build_projection_store(read_projections()), number=5) / 5
+    df = read_projections()
+    store = build_projection_store(df)
+    day = pd.Timestamp(df['Day'].iloc[len(df)//2]).normalize()
+    print('{} rows, store built in {:.1f} ms'.format(len(df), 1000*build_time))
+
+    report('location time series', lambda: mask_location(df, 'US', 'California'),
+           lambda: index_location(store, 'US', 'California'))
+    report('countries of Europe on day', lambda: mask_map(df, 'Europe', day),
+           lambda: index_map(store, 'Europe', day))
+    report('continent stat on day', lambda: mask_stat(df, 'Europe', day),
+           lambda: index_stat(store, 'Europe', day))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# Compares the single-patient scoring path of the calculators against the
+# list/DataFrame version it replaced (both stop after predict_proba).
+# Run from the repository root: python -m benchmarks.risk_single_row
+import pickle
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from risk_calculator.utils import prepare_model, get_feature_vector, score_feature_vector
+
+bundle_path = 'assets/risk_calculators/mortality/model_with_lab.pkl'
+
+def legacy_score(m, model, features, imputer, feature_vals, columns, temp_unit):
+    x = [0]*len(model.feature_importances_)
+    convert_temperature = temp_unit[0] == "°C"
+    i = 0
+    for feat in features["categorical"]:
+        x[feat["index"]] = feature_vals[i]
+        i+=1
+    for feat in features["numeric"]:
+        if feat["name"] == "Body Temperature" and convert_temperature:
+            x[feat["index"]] = feature_vals[i]*9/5+32
+        else:
+            x[feat["index"]] = feature_vals[i]
+        i+=1
+    if m:
+        indexes = features["multidrop"][0]["index"]
+        for c in feature_vals[i]:
+            x[indexes[features["multidrop"][0]["vals"].index(c)]] = 1
+    x_full = imputer.transform([x])
+    X = pd.DataFrame(columns = columns, index = range(1), dtype=float)
+    X.loc[0]=x_full[0]
+    return int(100*round(model.predict_proba(X)[:,1][0], 2))
+
+def prepared_score(prepared, feature_vals, temp_unit):
+    return score_feature_vector(prepared, get_feature_vector(prepared, feature_vals, temp_unit))[0]
+
+def get_patient(features):
+    # defaults for every input, one lab value missing so the imputer has work to do
+    vals = [feat["default"] for feat in features["categorical"] + features["numeric"]]
+    vals[-1] = np.nan
+    return vals + [features["multidrop"][0]["vals"][:1]]
+
+def report(name, fn, number=200):
+    t = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print('{:<10} {:>8.1f} us'.format(name, 1e6*t))
+    return t
+
+def main(bundle=None):
+    if bundle is None:
+        with open(bundle_path, 'rb') as f:
+            bundle = pickle.load(f)
+    prepared = prepare_model('mortality_labs', True, bundle)
+    features = bundle["json"]
+    feature_vals = get_patient(features)
+    temp_unit = ["°F"]
+    before = report('before', lambda: legacy_score(
+        True, bundle["model"], features, bundle["imputer"], feature_vals, bundle["columns"], temp_unit))
+    after = report('after', lambda: prepared_score(prepared, feature_vals, temp_unit))
+    print('x{:.1f}'.format(before/after))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Sweeps every (Param1, Param2, Param3) of the IHME transfers table, doing the
+# data access of the transfer callbacks (state options and table) the way they
+# used to (read the CSV, filter with masks) and through the partitioned store.
+# Run from the repository root: python -m benchmarks.ventilator_sweep
+import time
+import itertools
+
+from data_cache import clear_cache
+from ventilators.utils import read_ventilator_table, get_transfers_store, get_params_key, get_first_date
+from ventilators.transfers_funcs import get_transfers_on
+
+def mask_transfers_on(chosen_date, p1, p2, p3):
+    df = read_ventilator_table('transfers_table', 'ihme')
+    return df.loc[
+        (df['Date']==chosen_date) &
+        (df.Param1==float(p1)) &
+        (df.Param2==float(p2)) &
+        (df.Param3==float(p3))
+    ]
+
+def sweep(fn, params, chosen_date):
+    start = time.perf_counter()
+    rows = 0
+    for p1, p2, p3 in params:
+        # the options and the table callbacks both need the day's transfers
+        for _ in range(2):
+            rows += len(fn(chosen_date, p1, p2, p3))
+    return time.perf_counter() - start, rows
+
+def main():
+    clear_cache()
+    start = time.perf_counter()
+    store = get_transfers_store('ihme')
+    build_time = time.perf_counter() - start
+    params = list(itertools.product(*store['params']))
+    params = [p for p in params if get_params_key(*p) in store['partitions']]
+    chosen_date = get_first_date()
+    print('{} parameter combinations, store built in {:.1f} ms'.format(len(params), 1000*build_time))
+
+    mask_time, mask_rows = sweep(mask_transfers_on, params, chosen_date)
+    store_time, store_rows = sweep(lambda *args: get_transfers_on("Washington IHME", *args), params, chosen_date)
+    assert mask_rows == store_rows
+    print('read + mask {:>9.1f} ms'.format(1000*mask_time))
+    print('store       {:>9.1f} ms   x{:.0f}'.format(1000*store_time, mask_time/store_time))
+
+if __name__ == '__main__':
+    main()
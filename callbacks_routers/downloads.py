@@ -0,0 +1,6 @@
+from downloads import send_download
+
+def register_callbacks(app):
+    @app.server.route('/download/<name>', methods=['GET'])
+    def download_file(name):
+        return send_download(name)
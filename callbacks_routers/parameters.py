@@ -0,0 +1,39 @@
+from dash.dependencies import Input, Output
+
+from projections.parameters import get_parameter_rows
+from projections.parameters_explorer import get_parameter_columns, build_parameter_scatter, build_what_if, what_if_sliders
+
+def register_callbacks(app):
+    @app.callback(
+        [Output('parameters-table', 'data'),
+         Output('parameters-table', 'columns')],
+        [Input('parameters_vintage', 'value'),
+         Input('parameters_compare', 'value'),
+         Input('parameters_continent', 'value'),
+         Input('parameters-table', 'sort_by')])
+    def update_parameters_table(vintage, compare, continent, sort_by):
+        compare = compare if compare != vintage else None
+        sort_col, ascending = None, True
+        if sort_by:
+            sort_col, ascending = sort_by[0]['column_id'], sort_by[0]['direction'] == 'asc'
+        df = get_parameter_rows(vintage, compare, continent, sort_col, ascending)
+        return df.to_dict('records'), get_parameter_columns(compare)
+
+    @app.callback(
+        Output('parameters_scatter', 'children'),
+        [Input('parameters_vintage', 'value'),
+         Input('parameters_compare', 'value'),
+         Input('parameters_continent', 'value'),
+         Input('parameters_x', 'value'),
+         Input('parameters_y', 'value')])
+    def update_parameters_scatter(vintage, compare, continent, x_col, y_col):
+        return build_parameter_scatter(vintage, compare, continent, x_col, y_col)
+
+    @app.callback(
+        Output('what_if_graph', 'children'),
+        [Input('what_if_location', 'value'),
+         Input('parameters_vintage', 'value'),
+         Input('what_if_value', 'value')] +
+        [Input(id, 'value') for id, *_ in what_if_sliders])
+    def update_what_if(location, vintage, val, *values):
+        return build_what_if(location, vintage, val, values)
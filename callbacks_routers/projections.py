@@ -4,10 +4,16 @@ from datetime import datetime as dt
 from dash.dependencies import Output, Input
 import flask
 
-from projections.visuals_funcs import build_us_map, get_stat, build_continent_map, build_state_projection
+from projections.visuals_funcs import build_us_map, get_stat, build_continent_map, build_state_projection, warm_map_cache
+from projections.visuals_funcs import build_us_map_animation, build_continent_map_animation, build_forecast_revisions
 from projections.utils import get_df_projections, get_world_map_text
 
 def register_callbacks(app):
+    # optionally build the map figures of the next N days at boot (shared by workers with --preload)
+    prewarm_days = os.environ.get('PREWARM_PROJECTION_MAPS')
+    if prewarm_days:
+        warm_map_cache(int(prewarm_days))
+
     @app.server.route('/DELPHI_documentation_pdf', methods=['GET', 'POST'])
     def download_delphi_documentation():
         return flask.send_from_directory(directory=os.path.join(app.server.root_path, "assets/documentations"),
@@ -77,13 +83,30 @@ def register_callbacks(app):
         country = 'None' if country == None else country
         return build_state_projection(state, country, continent, val)
 
+    @app.callback(
+        Output('forecast_revisions_graph', 'children'),
+        [Input('province_dropdown', 'value'),
+         Input('country_dropdown', 'value'),
+         Input('location_map_dropdown', 'value'),
+         Input('revisions_value', 'value')
+         ])
+    def update_forecast_revisions(state, country, continent, val):
+        state = 'None' if state == None else state
+        country = 'None' if country == None else country
+        return build_forecast_revisions(state, country, continent, val)
+
     @app.callback(
         Output('map_projections', 'children'),
         [Input('us-map-date-picker-range', 'date'),
          Input('us_map_dropdown', 'value'),
          Input('location_map_dropdown', 'value'),
-         Input('radio_botton', 'value')])
-    def update_us_map(chosen_date,val, location,pop):
+         Input('radio_botton', 'value'),
+         Input('map-animation-projections', 'value')])
+    def update_us_map(chosen_date,val, location,pop,animate):
+        if animate:
+            if location == 'US':
+                return build_us_map_animation(chosen_date,val,pop)
+            return build_continent_map_animation(chosen_date,val,location,pop)
         if location == 'US':
             return build_us_map(chosen_date,val,pop)
         else:
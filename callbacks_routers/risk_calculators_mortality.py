@@ -1,32 +1,23 @@
-import os
-import base64
-from io import BytesIO
-import pickle
-
+import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State, ALL
 
 from risk_calculator.mortality.calculator import predict_risk_mort, get_languages
 from risk_calculator.features import build_feature_cards, build_feature_importance_graph, oxygen_options
 from risk_calculator.utils import build_lab_ques_card, labs_ques, valid_input, switch_oxygen, get_oxygen_info
+from risk_calculator.explanations import poll_force_plot
+from risk_calculator.batch import get_batch_response
+from risk_calculator.models import get_model, get_model_info
 
 def register_callbacks(app):
-    with open('assets/risk_calculators/mortality/model_with_lab.pkl', 'rb') as labs, \
-        open('assets/risk_calculators/mortality/model_without_lab.pkl', 'rb') as no_labs:
-        labs = pickle.load(labs)
-        no_labs = pickle.load(no_labs)
-    labs_model = labs["model"]
+    # the models themselves are loaded on the first prediction
+    labs = get_model_info('mortality_labs')
+    no_labs = get_model_info('mortality_no_labs')
     labs_features = labs["json"]
-    labs_imputer = labs["imputer"]
-    labs_explainer = labs["explainer"]
-    labs_cols = labs["columns"]
     labs_auc = labs["AUC"]
     labs_population = [labs["Size Training"],labs["Size Test"]]
     labs_positive = [labs["Percentage Training"],labs["Percentage Test"]]
-    no_labs_model = no_labs["model"]
     no_labs_features = no_labs["json"]
-    no_labs_imputer = no_labs["imputer"]
-    no_labs_explainer = no_labs["explainer"]
     no_labs_cols = no_labs["columns"]
     no_labs_auc = no_labs["AUC"]
     no_labs_population = [no_labs["Size Training"],no_labs["Size Test"]]
@@ -42,15 +33,6 @@ def register_callbacks(app):
                 )
     oxygen_in_mort, oxygen_mort_ind = get_oxygen_info(no_labs_cols,no_labs_features["numeric"])
 
-    #displaying shap image
-    @app.server.route("/")
-    def display_fig_mort(img, close_all=True):
-        imgByteArr = BytesIO()
-        img.savefig(imgByteArr, format='PNG')
-        imgByteArr = imgByteArr.getvalue()
-        encoded=base64.b64encode(imgByteArr)
-        return 'data:image/png;base64,{}'.format(encoded.decode())
-
     @app.callback(
         Output('page-desc-mortality', 'children'),
         [Input('language-calc-mortality', 'value')])
@@ -127,8 +109,8 @@ def register_callbacks(app):
         [Output('score-calculator-card-body', 'children'),
         Output('calc-input-error', 'children'),
         Output('imputed-text-mortality', 'children'),
-        Output('visual-1-mortality', 'src'),
-        Output('visual-1-mortality', 'style'),
+        Output('visual-1-mortality-graph', 'children'),
+        Output('visual-1-mortality-job', 'data'),
         Output('visual-1-mortality-explanation', 'children')],
         [Input('language-calc-mortality', 'value'),
         Input('submit-features-calc', 'n_clicks'),
@@ -154,15 +136,27 @@ def register_callbacks(app):
                 valid, err, x = valid_input(no_labs_features["numeric"],x[0],len(no_labs_features["numeric"]),language)
             if valid:
                 if labs:
-                    score, imputed, fig = predict_risk_mort(labs_cols,labs_model,labs_features,labs_imputer,labs_explainer,x,temp_unit,languages["results_card_mortality"][language],language)
-                else:
-                    score, imputed, fig = predict_risk_mort(no_labs_cols,no_labs_model,no_labs_features,no_labs_imputer,no_labs_explainer,x,temp_unit,languages["results_card_mortality"][language],language)
-                if fig:
-                    image = display_fig_mort(fig)
+                    score, imputed, figure, plot_job = predict_risk_mort(get_model('mortality_labs'),x,temp_unit,languages["results_card_mortality"][language],language)
                 else:
-                    image = ''
-                return score,'',imputed,image,{"height":200},languages["visual_1"][language]
+                    score, imputed, figure, plot_job = predict_risk_mort(get_model('mortality_no_labs'),x,temp_unit,languages["results_card_mortality"][language],language)
+                graph = dcc.Graph(figure=figure, config={'displayModeBar': False}) if figure else None
+                return score,'',imputed,graph,plot_job,languages["visual_1"][language]
             else:
-                return default,err,'','',{},''
+                return default,err,'',None,None,''
         #user has not clicked submit
-        return default,'','','',{},''
+        return default,'','',None,None,''
+
+    #displaying shap image once it has been rendered in the background
+    @app.callback(
+        [Output('visual-1-mortality', 'src'),
+        Output('visual-1-mortality', 'style'),
+        Output('visual-1-mortality-interval', 'disabled')],
+        [Input('visual-1-mortality-interval', 'n_intervals'),
+        Input('visual-1-mortality-job', 'data')])
+    def poll_shap_plot_mortality(n_intervals,job):
+        return poll_force_plot(job)
+
+    #scoring a whole list of patients at once
+    @app.server.route('/api/risk_calculator/mortality', methods=['POST'])
+    def score_mortality_batch():
+        return get_batch_response('mortality_labs', 'mortality_no_labs')
@@ -0,0 +1,17 @@
+import re
+
+import flask
+
+from risk_calculator.explanations import explanations_dir
+from risk_calculator.utils import get_risk_cache_stats
+
+def register_callbacks(app):
+    @app.server.route('/risk_calculator/explanation/<key>.png', methods=['GET'])
+    def download_risk_explanation(key):
+        if not re.fullmatch('[0-9a-f]{40}', key):
+            flask.abort(404)
+        return flask.send_from_directory(explanations_dir, key + '.png', mimetype='image/png')
+
+    @app.server.route('/risk_calculator/cache', methods=['GET'])
+    def risk_cache_stats():
+        return flask.jsonify(get_risk_cache_stats())
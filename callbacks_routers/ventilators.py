@@ -4,17 +4,23 @@ import os
 from dash.dependencies import Output, Input
 import flask
 
-from ventilators.shortage_funcs import build_shortage_map,build_shortage_timeline
-from ventilators.transfers_funcs import build_transfers_map,build_transfers_timeline,build_transfer_options,generate_table
-from ventilators.utils import build_download_link_demand, build_download_link_transfers
+from ventilators.shortage_funcs import build_shortage_map,build_shortage_map_animation,build_shortage_timeline
+from ventilators.transfers_funcs import build_transfers_map,build_transfers_timeline,build_transfer_options,get_transfers_page
+from ventilators.utils import build_download_link_demand, build_download_link_transfers, warm_ventilator_stores
 
 def register_callbacks(app):
+    # tables and shortage series are built at boot (shared by workers with --preload)
+    warm_ventilator_stores()
+
     @app.callback(
         Output('us_map_projections_vent', 'children'),
         [Input('base-model-dropdown', 'value'),
          Input('us-map-date-picker-range-vent', 'date'),
-         Input('us_map_dropdown-vent', 'value')])
-    def update_shortage_map(chosen_model,chosen_date,val):
+         Input('us_map_dropdown-vent', 'value'),
+         Input('map-animation-vent', 'value')])
+    def update_shortage_map(chosen_model,chosen_date,val,animate):
+        if animate:
+            return build_shortage_map_animation(chosen_model,chosen_date,val)
         return build_shortage_map(chosen_model,chosen_date,val)
 
     @app.callback(
@@ -68,18 +74,21 @@ def register_callbacks(app):
             return u'The following presents which states receive how many ventilators from {}'.format(state)
 
     @app.callback(
-        Output('table-container', 'children'),
+        [Output('transfers-table', 'data'),
+         Output('transfers-table', 'page_count')],
         [Input('base-model-dropdown', 'value'),
          Input('date-transfer-dropdown', 'date'),
          Input('transfer-to-from-dropdown', 'value'),
          Input('transfer-state-dropdown', 'value'),
          Input('p1-transfer-dropdown', 'value'),
          Input('p2-transfer-dropdown', 'value'),
-         Input('p3-transfer-dropdown', 'value')])
-    def display_table(chosen_model,chosen_date,to_or_from,state,p1,p2,p3):
-        if state is None:
-            return generate_table(chosen_model,chosen_date,p1,p2,p3)
-        return generate_table(chosen_model,chosen_date,p1,p2,p3,to_or_from,state)
+         Input('p3-transfer-dropdown', 'value'),
+         Input('transfers-table', 'page_current'),
+         Input('transfers-table', 'page_size'),
+         Input('transfers-table', 'sort_by'),
+         Input('transfers-table', 'filter_query')])
+    def display_table(chosen_model,chosen_date,to_or_from,state,p1,p2,p3,page_current,page_size,sort_by,filter_query):
+        return get_transfers_page(chosen_model,chosen_date,p1,p2,p3,to_or_from,state,page_current,page_size,sort_by,filter_query)
 
     @app.callback(
         Output('download-link-demand', 'href'),
@@ -0,0 +1,34 @@
+import os
+import threading
+
+# Process-wide cache for parsed data files. Each entry is keyed by a name and
+# remembers the mtimes of the files it was built from, so a new data drop is
+# picked up on the next call without restarting the workers.
+_cache = {}
+# reentrant: a loader may itself read other cached entries
+_lock = threading.RLock()
+
+def get_mtimes(paths):
+    return tuple(os.path.getmtime(p) for p in paths)
+
+# stamp is any extra value the entry depends on (e.g. today's date)
+def load_cached(key, paths, loader, stamp=None):
+    if isinstance(paths, str):
+        paths = [paths]
+    version = (get_mtimes(paths), stamp)
+    entry = _cache.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None or entry[0] != version:
+            entry = (version, loader())
+            _cache[key] = entry
+    return entry[1]
+
+def clear_cache(key=None):
+    with _lock:
+        if key is None:
+            _cache.clear()
+        else:
+            _cache.pop(key, None)
@@ -1,6 +1,5 @@
 ### Data
 import pandas as pd
-import urllib
 
 import dash_table
 import dash_core_components as dcc
@@ -10,6 +9,7 @@ import dash_bootstrap_components as dbc
 from navbar import Navbar
 from footer import Footer
 from assets.mappings import get_data_cols
+from downloads import get_download_url
 
 def Dataset():
 	nav = Navbar()
@@ -21,10 +21,6 @@ def Dataset():
 	ref = pd.read_csv(ref_data)
 	df = pd.read_csv(dataset)
 
-	data_csv_string = df.to_csv(index=False, encoding='utf-8')
-	data_csv_string = "data:text/csv;charset=utf-8," + urllib.parse.quote(data_csv_string)
-	ref_data_csv_string = ref.to_csv(index=False, encoding='utf-8')
-	ref_data_csv_string = "data:text/csv;charset=utf-8," + urllib.parse.quote(ref_data_csv_string)
 
 	df = df.loc[:,get_data_cols()]
 	df = df.head(50)
@@ -105,7 +101,7 @@ def Dataset():
 							"Download the Data",
 							id="download-link",
 							download="covid_analytics_clinical_data.csv",
-							href=data_csv_string,
+							href=get_download_url("covid_analytics_clinical_data.csv"),
 		        			target="_blank"
 						),
 						style={'textAlign':"center"}
@@ -117,7 +113,7 @@ def Dataset():
 							"Download the Reference for Lab Values",
 							id="download-reference-link",
 							download="covid_analytics_reference_ranges.csv",
-							href=ref_data_csv_string,
+							href=get_download_url("covid_analytics_reference_ranges.csv"),
 		        			target="_blank"
 						),
 						style={'textAlign':"center"}
@@ -0,0 +1,47 @@
+import os
+import gzip
+import shutil
+import tempfile
+
+import flask
+
+# Files offered for download, by the name they are saved under. Pages link to
+# /download/<name> instead of embedding the whole CSV as a data: URI.
+downloads = {
+    'covid_analytics_clinical_data.csv': 'data/clinical_outcomes_database.csv',
+    'covid_analytics_reference_ranges.csv': 'data/reference_ranges.csv',
+    'covid_analytics_ventilator_demand_ihme.csv': 'data/predicted_ventilator/state_supplies_table-ihme.csv',
+    'covid_analytics_ventilator_demand_ode.csv': 'data/predicted_ventilator/state_supplies_table-ode.csv',
+    'covid_analytics_ventilator_transfers_ihme.csv': 'data/predicted_ventilator/transfers_table-ihme.csv',
+    'covid_analytics_ventilator_transfers_ode.csv': 'data/predicted_ventilator/transfers_table-ode.csv',
+}
+# gzipped copies, shared by all workers and rebuilt when the file changes
+gzip_dir = os.path.join(tempfile.gettempdir(), 'covidanalytics_downloads')
+
+def get_download_url(name):
+    return '/download/' + name
+
+def get_gzip_path(name):
+    path = downloads[name]
+    gzip_path = os.path.join(gzip_dir, name + '.gz')
+    if not os.path.exists(gzip_path) or os.path.getmtime(gzip_path) < os.path.getmtime(path):
+        os.makedirs(gzip_dir, exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(gzip_path, os.getpid())
+        with open(path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, gzip_path)
+    return gzip_path
+
+# Streams the file with ETag/Last-Modified (so repeated downloads get a 304),
+# gzipped when the client accepts it
+def send_download(name):
+    path = downloads.get(name)
+    if path is None or not os.path.exists(path):
+        flask.abort(404)
+    if 'gzip' in flask.request.accept_encodings:
+        response = flask.send_file(os.path.abspath(get_gzip_path(name)), 'text/csv', True, name, conditional=True)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = flask.send_file(os.path.abspath(path), 'text/csv', True, name, conditional=True)
+    response.vary.add('Accept-Encoding')
+    return response
@@ -5,6 +5,9 @@ from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
 import flask
 import os
+import json
+import datetime
+import plotly
 
 from about_us.team import Team
 from about_us.press import Press
@@ -16,11 +19,16 @@ from homepage import Homepage
 from interactive_graphs.interactive import InteractiveGraph
 from projections.projections import ProjectState
 from projections.projections_documentation import Projections_documentation
+from projections.parameters_explorer import ParameterExplorer
 from policies.main import Policies
 from risk_calculator.mortality.calculator import RiskCalc
 from risk_calculator.infection.calculator import InfectionRiskCalc
 from ventilators.allocations import VentilatorAllocations
 from financial.main import FinancialReliefPlanning
+from projections.utils import projections_path, population_path
+from projections.parameters import get_parameter_paths
+from policies.scenarios import scenarios_path
+from data_cache import load_cached
 
 import callbacks_routers.ventilators as ventilators
 import callbacks_routers.insights as insights
@@ -28,6 +36,9 @@ import callbacks_routers.projections as projections
 import callbacks_routers.risk_calculators_mortality as risk_calculators_mortality
 import callbacks_routers.risk_calculators_infection as risk_calculators_infection
 import callbacks_routers.policies as policies
+import callbacks_routers.risk_explanations as risk_explanations
+import callbacks_routers.downloads as downloads
+import callbacks_routers.parameters as parameters
 
 app = dash.Dash(
         __name__,
@@ -54,45 +65,60 @@ projections.register_callbacks(app)
 risk_calculators_infection.register_callbacks(app)
 risk_calculators_mortality.register_callbacks(app)
 policies.register_callbacks(app)
+risk_explanations.register_callbacks(app)
+downloads.register_callbacks(app)
+parameters.register_callbacks(app)
 
 @app.server.route('/favicon.ico')
 def favicon():
     return flask.send_from_directory(os.path.join(app.server.root_path, 'static'),
                                      'favicon.ico', mimetype='image/x-icon')
 
+# data files each page is built from (or a function listing them, when files
+# are added over time), and whether it shows dates relative to today
+page_layouts = {
+    '/dataset': (Dataset, ['data/clinical_outcomes_database.csv', 'data/reference_ranges.csv'], False),
+    '/dataset_documentation': (Dataset_documentation, [], False),
+    '/interactive-graph': (InteractiveGraph, ['data/clinical_outcomes_database.csv'], False),
+    '/projections': (ProjectState, [projections_path, population_path], True),
+    '/projections_documentation': (Projections_documentation, [], False),
+    '/projections_parameters': (ParameterExplorer, get_parameter_paths, False),
+    '/policies': (Policies, [scenarios_path], False),
+    '/ventilator_allocation': (VentilatorAllocations, [
+        'data/predicted_ventilator/transfers_table-ihme.csv',
+        'data/predicted_ventilator/state_supplies_table_baseline-ihme.csv'
+    ], False),
+    '/mortality_calculator': (RiskCalc, [], False),
+    '/infection_calculator': (InfectionRiskCalc, [], False),
+    '/financial_relief': (FinancialReliefPlanning, [], False),
+    '/team': (Team, [
+        'assets/team_members/core_team.yml',
+        'assets/team_members/associated_team.yml',
+        'assets/team_members/faculty.yml'
+    ], False),
+    '/contact': (Contact, [], False),
+    '/press': (Press, ['assets/press/important_press.yml', 'assets/press/press.yml'], False),
+    '/collaborators': (Collaborators, ['assets/collaborators/organizations.yml'], False),
+    '/': (Homepage, [projections_path, population_path], True),
+}
+
+# Each page is built and serialized once per worker, and rebuilt when one of
+# its data files changes or, for dated pages, when the day changes
+def get_page_layout(pathname):
+    if pathname not in page_layouts:
+        pathname = '/'
+    page, paths, dated = page_layouts[pathname]
+    return load_cached(
+        'layout ' + pathname,
+        paths() if callable(paths) else paths,
+        lambda: json.loads(json.dumps(page(), cls=plotly.utils.PlotlyJSONEncoder)),
+        stamp=datetime.date.today() if dated else None
+    )
+
 # redirects to different pages
 @app.callback(Output('page-content', 'children'),[Input('url', 'pathname')])
 def display_page(pathname):
-    if pathname == '/dataset':
-        return Dataset()
-    if pathname == '/dataset_documentation':
-        return Dataset_documentation()
-    if pathname == '/interactive-graph':
-        return InteractiveGraph()
-    if pathname == '/projections':
-        return ProjectState()
-    if pathname == '/projections_documentation':
-        return Projections_documentation()
-    if pathname == '/policies':
-        return Policies()
-    if pathname == '/ventilator_allocation':
-        return VentilatorAllocations()
-    if pathname == '/mortality_calculator':
-        return RiskCalc()
-    if pathname == '/infection_calculator':
-        return InfectionRiskCalc()
-    if pathname == '/financial_relief':
-        return FinancialReliefPlanning()
-    if pathname == '/team':
-        return Team()
-    if pathname == '/contact':
-        return Contact()
-    if pathname == '/press':
-        return Press()
-    if pathname == '/collaborators':
-        return Collaborators()
-    else:
-        return Homepage()
+    return get_page_layout(pathname)
 
 #Callbacks for navbar
 @app.callback(
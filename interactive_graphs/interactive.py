@@ -1,5 +1,5 @@
+import numpy as np
 import pandas as pd
-import urllib
 import plotly.graph_objects as go
 from textwrap import wrap
 import dash_core_components as dcc
@@ -9,11 +9,40 @@ import dash_bootstrap_components as dbc
 from navbar import Navbar
 from footer import Footer
 from assets.mappings import get_colors
+from downloads import get_download_url
+from data_cache import load_cached
+
+clinical_path = 'data/clinical_outcomes_database.csv'
+# upper bounds of the population size buckets, the last one is closed by the largest study
+bucket_bounds = [100,500,1000,2000]
+
+def read_clinical_outcomes(path=clinical_path):
+    df = pd.read_csv(path)
+    for c in df.columns[df.dtypes == object]:
+        # percentages ("30%") and numbers stored as text, with "na" for missing values
+        values = df[c].str.strip().str.rstrip('%').replace('na', np.nan)
+        numeric = pd.to_numeric(values, errors='coerce')
+        if numeric.notna().any() and numeric.notna().sum() == values.notna().sum():
+            df[c] = numeric
+    return df
+
+# Rows of each (Survivors, population bucket) pair, for the studies that have both
+def build_clinical_store(df):
+    pop = df["Study Pop Size (N)"].values
+    rows = np.flatnonzero(df['Survivors'].notna().values & df['Country'].notna().values & ~np.isnan(pop))
+    buckets = np.searchsorted(bucket_bounds, pop[rows], side='left')
+    groups = pd.Series(rows).groupby([df['Survivors'].values[rows], buckets]).indices
+    return {
+        'df': df,
+        'survivors': [x for x in df.Survivors.unique() if str(x) != 'nan'],
+        'groups': {(s, int(b)): rows[ind] for (s, b), ind in groups.items()},
+    }
+
+def get_clinical_store():
+    return load_cached('clinical outcomes', clinical_path, lambda: build_clinical_store(read_clinical_outcomes()))
 
 def InteractiveGraph():
-    df = pd.read_csv('data/clinical_outcomes_database.csv')
-    data_csv_string = df.to_csv(index=False, encoding='utf-8')
-    data_csv_string = "data:text/csv;charset=utf-8," + urllib.parse.quote(data_csv_string)
+    store = get_clinical_store()
 
     nav = Navbar()
     footer = Footer()
@@ -22,8 +51,7 @@ def InteractiveGraph():
 
     demographics = ["Median Age", "% Male"]
 
-    survivor_options = df.Survivors.unique()
-    survivor_options = [x for x in survivor_options if str(x) != 'nan']
+    survivor_options = store['survivors']
 
     body = dbc.Container(
         [
@@ -142,7 +170,7 @@ def InteractiveGraph():
                             "Download the Data",
                             id="download-link",
                             download="covid_analytics_clinical_data.csv",
-                            href=data_csv_string,
+                            href=get_download_url("covid_analytics_clinical_data.csv"),
                             target="_blank"
                         ),
                         style={'textAlign':"center"}
@@ -157,53 +185,49 @@ def InteractiveGraph():
     layout = html.Div([nav, body, footer],className="site")
     return layout
 
-def graph_bucket(x,buckets):
-    numBuckets = len(buckets)
-    b = 0
-    while b < numBuckets and x > buckets[b]:
-        b+=1
-    # b should never be == numBuckets but just in case
-    return buckets[b] if b < numBuckets else max_pop
-
 def get_lb(ind,buckets):
     return str(buckets[ind-1]) if ind > 0 else '0'
 
 
 def build_graph(y_title,x_title,survivor_vals):
-    df = pd.read_csv('data/clinical_outcomes_database.csv')
+    store = get_clinical_store()
+    df = store['df']
     if y_title not in df.columns or x_title not in df.columns:
         return None
-    cols = [x_title,y_title] + ["Survivors","Country"]
-    pre_cols = cols + ["Study Pop Size (N)"]
-    post_cols = cols + ["Population"]
-    df = df[pre_cols]
-    df = df.dropna()
-    max_pop = max(df["Study Pop Size (N)"].values)
+    # studies reporting both values, by (Survivors, bucket)
+    valid = df[x_title].notna().values & df[y_title].notna().values
+    groups = {key: rows[valid[rows]] for key, rows in store['groups'].items()}
+    groups = {key: rows for key, rows in groups.items() if len(rows)}
+    if not groups:
+        return None
+    pop = df["Study Pop Size (N)"].values
+    max_pop = max(pop[rows].max() for rows in groups.values())
     #round up the maximum number to the nearest hundred
     max_pop = int(max_pop) + 100 - int(max_pop) % 100
-    buckets = [100,500,1000,2000,max_pop]
-    df["Population"] = df["Study Pop Size (N)"].apply(lambda x: graph_bucket(x,buckets))
-    df = df[post_cols]
-    df = df[df['Survivors'].isin(survivor_vals)]
-
+    buckets = bucket_bounds + [max_pop]
+    # in order of their first study, as the legend used to be
+    first_row = {}
+    for (i, b), rows in groups.items():
+        if i in survivor_vals:
+            first_row[i] = min(first_row.get(i, rows[0]), rows[0])
+    no_rows = np.array([], dtype=int)
 
     colors = get_colors()
     fig = go.Figure()
     color_ind = {'Non-survivors only':1,'Survivors only':4,'Both':2}
     sizes = [5,10,20,40,60]
-    for i in df.Survivors.unique():
-        s = 0
+    for i in sorted(first_row, key=first_row.get):
         for ind,j in enumerate(buckets):
+            rows = groups.get((i, ind), no_rows)
             fig.add_trace(go.Scatter(
-                x=df[(df['Survivors'] == i) & (df['Population'] == j)][x_title],
-                y=df[(df['Survivors'] == i) & (df['Population'] == j)][y_title],
+                x=df[x_title].values[rows],
+                y=df[y_title].values[rows],
                 legendgroup=i,
                 name= '{} <br> {} < Pop. Size < {}'.format(i, get_lb(ind,buckets),str(int(j))),
                 mode="markers",
                 marker=dict(color=colors[color_ind[i]], size=sizes[ind]),
-                text=df['Country'],
+                text=df['Country'].values[rows],
             ))
-            s+=1
 
     fig.update_layout(
                 height=550,
@@ -0,0 +1,67 @@
+import json
+
+import plotly.graph_objects as go
+import dash_core_components as dcc
+
+# Date playback for the choropleth maps. The figure keeps a single trace with
+# the locations (the geometry is sent once); each frame only carries one date's
+# z and hover text, and the slider and play button switch frames in the browser.
+frame_duration = 200
+
+def get_animation_controls(names, labels):
+    step = {'mode': 'immediate', 'frame': {'duration': 0, 'redraw': True}, 'transition': {'duration': 0}}
+    play = {'mode': 'immediate', 'fromcurrent': True, 'frame': {'duration': frame_duration, 'redraw': True}, 'transition': {'duration': 0}}
+    pause = {'mode': 'immediate', 'frame': {'duration': 0, 'redraw': False}, 'transition': {'duration': 0}}
+    sliders = [dict(
+        active=0,
+        currentvalue={'visible': False},
+        pad={'t': 10, 'b': 10},
+        steps=[dict(method='animate', label=label, args=[[name], step]) for name, label in zip(names, labels)],
+    )]
+    updatemenus = [dict(
+        type='buttons',
+        direction='left',
+        showactive=False,
+        x=0, y=0, xanchor='left', yanchor='top',
+        pad={'t': 60},
+        buttons=[
+            dict(label='Play', method='animate', args=[None, play]),
+            dict(label='Pause', method='animate', args=[[None], pause]),
+        ],
+    )]
+    return sliders, updatemenus
+
+# frames: one (name, slider label, z, hover text, title) per date; the figure's
+# trace is given the first frame's values
+def add_date_frames(fig, frames):
+    fig.frames = [
+        go.Frame(name=name, data=[go.Choropleth(z=z, text=text)], traces=[0], layout=dict(title_text=title))
+        for name, label, z, text, title in frames
+    ]
+    sliders, updatemenus = get_animation_controls([f[0] for f in frames], [f[1] for f in frames])
+    name, label, z, text, title = frames[0]
+    fig.update_traces(z=z, text=text)
+    # room under the map for the slider and buttons
+    fig.update_layout(title_text=title, sliders=sliders, updatemenus=updatemenus, margin_b=120)
+    return json.loads(fig.to_json())
+
+def get_animation_toggle(id):
+    return dcc.Checklist(
+        id=id,
+        options=[{'label': '  Play through all dates', 'value': 1}],
+        value=[],
+        style={'marginTop': 10},
+    )
+
+# Serialized animated figure starting on the named frame (or the first one).
+# Only the trace, title and slider are copied, the frames are shared.
+def select_frame(fig, name):
+    names = [frame['name'] for frame in fig['frames']]
+    if name not in names:
+        return fig
+    i = names.index(name)
+    frame = fig['frames'][i]
+    layout = dict(fig['layout'], sliders=[dict(fig['layout']['sliders'][0], active=i)])
+    layout['title'] = dict(layout.get('title', {}), **frame['layout']['title'])
+    data = [dict(fig['data'][0], z=frame['data'][0]['z'], text=frame['data'][0]['text'])]
+    return dict(fig, data=data, layout=layout)
@@ -153,7 +153,10 @@ def get_policy_card(ind):
                                 dbc.Row(
                                     [
                                         html.Div(
-                                            id="policy-week-text-{}".format(ind),
+                                            id={
+                                                'type': 'policy-week-text',
+                                                'index': ind,
+                                            },
                                             style={"paddingBottom": 20, "paddingLeft":10}
                                             ),
                                     ],
@@ -20,11 +20,39 @@ def map_policy(vec):
             return "Restrict Mass Gatherings"
     return "Restrict Non-Essential Businesses, Travel Restriction and Workplaces"
 
-def no_policy_chosen(policies):
-    for policy in policies:
-        if sum(policy) > 0:
-            return False
-    return True
+# Checklists of a policy card, as bits of the policy's bitmask
+policy_types = ['none', 'lockdown', 'mass', 'schools', 'others']
+
+def get_policy_mask(values):
+    return sum(1 << i for i, v in enumerate(values) if v)
+
+# Checklists left enabled by the ones ticked, as a bitmask
+def get_enabled_mask(mask):
+    if mask & 1:
+        return 0b00001
+    if mask & 2:
+        return 0b00010
+    if mask & 4:
+        return 0b11100
+    if mask & 16:
+        return 0b10100
+    return 0b10111
+
+# Scenario of every bitmask, ticked checklists that are disabled left out
+policy_names = [
+    map_policy([(m >> i) & 1 for i in range(len(policy_types))]) if m else None
+    for m in (mask & get_enabled_mask(mask) for mask in range(1 << len(policy_types)))
+]
+name_to_json = {
+    "No Restrictions": "No_Measure",
+    "Lockdown":"Lockdown",
+    "Restrict Mass Gatherings and Schools": "Restrict_Mass_Gatherings_and_Schools",
+    "Restrict Mass Gatherings": "Restrict_Mass_Gatherings",
+    "Restrict Non-Essential Businesses, Travel Restriction and Workplaces": "Mass_Gatherings_Authorized_But_Others_Restricted",
+    "Restrict Mass Gatherings, Non-Essential Businesses, Travel Restriction and Workplaces": "Authorize_Schools_but_Restrict_Mass_Gatherings_and_Others",
+    "Restrict Mass Gatherings, Schools, Non-Essential Businesses, Travel Restriction and Workplaces": "Restrict_Mass_Gatherings_and_Schools_and_Others"
+}
+policy_codes = [name_to_json[name] if name else None for name in policy_names]
 
 def get_projections():
     return \
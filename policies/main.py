@@ -1,4 +1,3 @@
-import json
 import plotly.graph_objects as go
 from textwrap import wrap
 import math
@@ -11,7 +10,8 @@ from navbar import Navbar
 from footer import Footer
 
 from policies.cards import get_state_num_policy_card, get_policy_cards, get_colors
-from policies.graphs import get_projections, map_policy, no_policy_chosen, get_start
+from policies.graphs import get_projections, get_start, policy_names, policy_codes
+from policies.scenarios import get_scenario_states, get_scenario_days, get_scenario_slice, get_scenario_truth, get_scenario_metrics
 
 def get_num_policies():
     return 3
@@ -20,10 +20,7 @@ def Policies():
     nav = Navbar()
     footer = Footer()
 
-    with open('assets/policies/US_Scenarios.json', 'rb') as file:
-        projections = json.load(file)
-
-    states = list(projections.keys())
+    states = get_scenario_states()
     num_policies = get_num_policies()
 
     body = dbc.Container(
@@ -66,72 +63,62 @@ def Policies():
     return layout
 
 
-def build_policy_projections(state, policies, times, value):
-    name_to_json = {
-        "No Restrictions": "No_Measure",
-        "Lockdown":"Lockdown",
-        "Restrict Mass Gatherings and Schools": "Restrict_Mass_Gatherings_and_Schools",
-        "Restrict Mass Gatherings": "Restrict_Mass_Gatherings",
-        "Restrict Non-Essential Businesses, Travel Restriction and Workplaces": "Mass_Gatherings_Authorized_But_Others_Restricted",
-        "Restrict Mass Gatherings, Non-Essential Businesses, Travel Restriction and Workplaces": "Authorize_Schools_but_Restrict_Mass_Gatherings_and_Others",
-        "Restrict Mass Gatherings, Schools, Non-Essential Businesses, Travel Restriction and Workplaces": "Restrict_Mass_Gatherings_and_Schools_and_Others"
-    }
-
-    map_time = {
-        0: "Now",
-        1: "One Week",
-        2: "Two Weeks",
-        3: "Four Weeks",
-        4: "Six Weeks"
-    }
-
-    if no_policy_chosen(policies):
-        return
-
-    with open('assets/policies/US_Scenarios.json', 'rb') as file:
-        projections = json.load(file)
+map_time = {
+    0: "Now",
+    1: "One Week",
+    2: "Two Weeks",
+    3: "Four Weeks",
+    4: "Six Weeks"
+}
+
+# Cases and deaths figures of the chosen policies, given as bitmasks of their
+# checklists, from one slice of the scenario arrays
+def build_policy_projections(state, masks, times):
+    chosen = [p for p, mask in enumerate(masks) if policy_codes[mask]]
+    if not chosen:
+        return [None, None]
+    values = get_scenario_slice(
+        state,
+        [policy_codes[masks[p]] for p in chosen],
+        [map_time[times[p]] for p in chosen]
+    )
+    x = get_scenario_days(state)
+    return [
+        build_policy_figure(state, value, [policy_names[masks[p]] for p in chosen], chosen, times, x, values[:, m])
+        for m, value in enumerate(get_scenario_metrics())
+    ]
 
+def build_policy_figure(state, value, names, chosen, times, x, values):
     colors = get_colors()
     fig = go.Figure()
 
-    data = projections[state]
-    x = data["Day"]
     max_y = 0
-    for p,policy in enumerate(policies):
-        if sum(policy) > 0:
-            name = map_policy(policy)
-            code = name_to_json[name]
-            t = map_time[times[p]]
-            y = data[code][t][value]
-            fig.add_trace(go.Scatter(
-                name='<br>'.join(wrap(name + "," + str(t), width=60)),
-                showlegend=True,
-                x=x,
-                y=y,
-                mode="lines",
-                marker=dict(color=colors[p]),
-                line=dict(color=colors[p],width=4)
-            ))
-            temp = max(data[code][t][value])
-            if temp > max_y:
-                max_y = int(math.ceil(temp / 100000.0)) * 100000
-
-    for p,policy in enumerate(policies):
-        if sum(policy) > 0:
-            y = [0,max_y]
-            x_vertical = [get_start(times[p])] * 2
-            fig.add_trace(go.Scatter(
-                showlegend=False,
-                x=x_vertical,
-                y=y,
-                line=dict(color=colors[p], width=1, dash='dash'),
-                marker=dict(color=colors[p], size=1)
-            ))
-    i= 0
-    y = []
-    while not math.isnan(data[value + " True"][i]):
-        y.append(data[value + " True"][i])
-        i+=1
+    for name, p, y in zip(names, chosen, values):
+        t = map_time[times[p]]
+        fig.add_trace(go.Scatter(
+            name='<br>'.join(wrap(name + "," + str(t), width=60)),
+            showlegend=True,
+            x=x,
+            y=y,
+            mode="lines",
+            marker=dict(color=colors[p]),
+            line=dict(color=colors[p],width=4)
+        ))
+        temp = float(y.max())
+        if temp > max_y:
+            max_y = int(math.ceil(temp / 100000.0)) * 100000
+
+    for p in chosen:
+        y = [0,max_y]
+        x_vertical = [get_start(times[p])] * 2
+        fig.add_trace(go.Scatter(
+            showlegend=False,
+            x=x_vertical,
+            y=y,
+            line=dict(color=colors[p], width=1, dash='dash'),
+            marker=dict(color=colors[p], size=1)
+        ))
+    y = get_scenario_truth(state, value)
     x = x[:len(y)]
 
     fig.add_trace(go.Scatter(
@@ -0,0 +1,152 @@
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+
+from data_cache import load_cached
+
+scenarios_path = 'assets/policies/US_Scenarios.json'
+# binary copy of the JSON: the dense values array is memory-mapped, so workers
+# share its pages through the OS page cache instead of each parsing the JSON
+values_path = 'assets/policies/US_Scenarios.npy'
+meta_path = 'assets/policies/US_Scenarios_meta.npz'
+logger = logging.getLogger(__name__)
+
+def get_scenario_codes():
+    return [
+        "No_Measure",
+        "Lockdown",
+        "Restrict_Mass_Gatherings_and_Schools",
+        "Restrict_Mass_Gatherings",
+        "Mass_Gatherings_Authorized_But_Others_Restricted",
+        "Authorize_Schools_but_Restrict_Mass_Gatherings_and_Others",
+        "Restrict_Mass_Gatherings_and_Schools_and_Others"
+    ]
+
+def get_start_times():
+    return ["Now", "One Week", "Two Weeks", "Four Weeks", "Six Weeks"]
+
+def get_scenario_metrics():
+    return ["Total Detected", "Total Detected Deaths"]
+
+def read_scenarios(path=scenarios_path):
+    with open(path, 'rb') as file:
+        projections = json.load(file)
+
+    states = list(projections.keys())
+    codes = get_scenario_codes()
+    times = get_start_times()
+    metrics = get_scenario_metrics()
+
+    # states start on different days but all end on the same one, so every
+    # series is right-aligned on a shared Day axis and padded with NaN
+    first_day = min(pd.Timestamp(projections[state]["Day"][0]) for state in states)
+    last_day = max(pd.Timestamp(projections[state]["Day"][-1]) for state in states)
+    days = pd.date_range(first_day, last_day).strftime('%Y-%m-%d').values.astype(str)
+    starts = np.zeros(len(states), dtype=np.int64)
+
+    values = np.full((len(states), len(codes), len(times), len(metrics), len(days)), np.nan, dtype=np.float32)
+    truth = np.full((len(states), len(metrics), len(days)), np.nan, dtype=np.float32)
+    for s, state in enumerate(states):
+        data = projections[state]
+        start = len(days) - len(data["Day"])
+        if not np.array_equal(data["Day"], days[start:]):
+            raise ValueError("Scenario days of {} are not consecutive up to {}".format(state, last_day.date()))
+        starts[s] = start
+        for c, code in enumerate(codes):
+            for t, time in enumerate(times):
+                for m, metric in enumerate(metrics):
+                    values[s, c, t, m, start:] = data[code][time][metric]
+        for m, metric in enumerate(metrics):
+            truth[s, m, start:] = data[metric + " True"]
+
+    return build_scenario_store(states, days, starts, values, truth)
+
+def build_scenario_store(states, days, starts, values, truth):
+    return {
+        'states': list(states),
+        'days': days,
+        'starts': starts,
+        'values': values,
+        'truth': truth,
+        'state_index': {state: i for i, state in enumerate(states)},
+        'code_index': {code: i for i, code in enumerate(get_scenario_codes())},
+        'time_index': {time: i for i, time in enumerate(get_start_times())},
+        'metric_index': {metric: i for i, metric in enumerate(get_scenario_metrics())},
+    }
+
+def write_scenarios_binary(store, values_path=values_path, meta_path=meta_path):
+    # written to temporary files of this process first, so concurrent workers
+    # never write into or see a partial file
+    values_tmp_path = '{}.{}.tmp.npy'.format(values_path[:-len('.npy')], os.getpid())
+    meta_tmp_path = '{}.{}.tmp.npz'.format(meta_path[:-len('.npz')], os.getpid())
+    np.save(values_tmp_path, store['values'])
+    np.savez(
+        meta_tmp_path,
+        states=np.array(store['states']),
+        days=store['days'],
+        starts=store['starts'],
+        truth=store['truth'],
+    )
+    os.replace(meta_tmp_path, meta_path)
+    os.replace(values_tmp_path, values_path)
+
+def read_scenarios_binary(values_path=values_path, meta_path=meta_path):
+    with np.load(meta_path) as meta:
+        states, days, starts, truth = meta['states'], meta['days'], meta['starts'], meta['truth']
+    values = np.load(values_path, mmap_mode='r')
+    return build_scenario_store(states.tolist(), days, starts, values, truth)
+
+def is_binary_fresh():
+    if not (os.path.exists(values_path) and os.path.exists(meta_path)):
+        return False
+    json_mtime = os.path.getmtime(scenarios_path)
+    return os.path.getmtime(values_path) >= json_mtime and os.path.getmtime(meta_path) >= json_mtime
+
+def load_scenarios():
+    if is_binary_fresh():
+        return read_scenarios_binary()
+    store = read_scenarios()
+    try:
+        write_scenarios_binary(store)
+    except OSError:
+        # the JSON will be parsed again on every reload
+        logger.warning('Could not write the binary copy of %s', scenarios_path, exc_info=True)
+    return store
+
+# Scenario arrays, loaded once per worker and reloaded when the JSON changes
+def get_scenario_store():
+    return load_cached('policy_scenarios', scenarios_path, load_scenarios)
+
+def get_scenario_states():
+    return get_scenario_store()['states']
+
+def get_scenario_days(state):
+    store = get_scenario_store()
+    return store['days'][store['starts'][store['state_index'][state]]:]
+
+# Values of several (code, time) scenarios of a state, read in one indexing of
+# the scenario array: (scenario, metric, day)
+def get_scenario_slice(state, codes, times):
+    store = get_scenario_store()
+    s = store['state_index'][state]
+    return store['values'][
+        s,
+        [store['code_index'][code] for code in codes],
+        [store['time_index'][time] for time in times],
+        :,
+        store['starts'][s]:
+    ]
+
+# Observed values, up to the last reported day
+def get_scenario_truth(state, metric):
+    store = get_scenario_store()
+    s = store['state_index'][state]
+    truth = store['truth'][s, store['metric_index'][metric], store['starts'][s]:]
+    missing = np.isnan(truth)
+    return truth[:np.argmax(missing)] if missing.any() else truth
+
+# Converts the JSON into its binary copy: python -m policies.scenarios
+if __name__ == '__main__':
+    write_scenarios_binary(read_scenarios())
@@ -0,0 +1,256 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from scipy.integrate import solve_ivp
+from scipy.optimize import nnls
+
+from data_cache import load_cached
+from projections.utils import get_cols, get_population_keys, read_population, population_path
+from projections.parameters import get_parameter_store, get_parameter_paths, parameter_cols
+from projections.vintages import get_vintage_store, get_snapshot_paths
+
+# Re-simulation of the DELPHI model (github.com/COVIDAnalytics/epidemic-model)
+# from the fitted parameters of Parameters_Global_*.csv. Locations, or several
+# parameter sets of one location, are integrated together as one ODE system
+# whose state is a (compartment, system) array.
+#
+# Compartments: S, E, I, AR, DHR, DQR, AD, DHD, DQD, R, D, TH, DVR, DVD, DD, DT
+IncubeD = 5  # days of incubation
+RecoverID = 10  # days to recover when not hospitalized
+RecoverHD = 15  # days to recover when hospitalized
+DetectD = 2  # days to detection
+VentilatedD = 10  # days to recover when ventilated
+p_v = 0.25  # share of hospitalized cases ventilated
+p_d = 0.2  # share of infections detected
+p_h = 0.15  # share of detected cases hospitalized
+r_i = np.log(2) / IncubeD
+r_d = np.log(2) / DetectD
+r_ri = np.log(2) / RecoverID
+r_rh = np.log(2) / RecoverHD
+r_rv = np.log(2) / VentilatedD
+n_compartments = 16
+fitted_cols = ["Infection Rate", "Median Day of Action", "Rate of Action", "Rate of Death",
+               "Mortality Rate", "Internal Parameter 1", "Internal Parameter 2"]
+
+def get_derivatives(t, x, alpha, days, r_s, r_dth, p_dth, N):
+    S, E, I, AR, DHR, DQR, AD, DHD, DQD, R, D, TH, DVR, DVD, DD, DT = x.reshape(n_compartments, -1)
+    # response of governments and people, as an arctan curve around the median day of action
+    gamma_t = (2 / np.pi) * np.arctan(-(t - days) / 20 * r_s) + 1
+    infections = alpha * gamma_t * S * I / N
+    return np.concatenate([
+        -infections,
+        infections - r_i * E,
+        r_i * E - r_d * I,
+        r_d * (1 - p_dth) * (1 - p_d) * I - r_ri * AR,
+        r_d * (1 - p_dth) * p_d * p_h * I - r_rh * DHR,
+        r_d * (1 - p_dth) * p_d * (1 - p_h) * I - r_ri * DQR,
+        r_d * p_dth * (1 - p_d) * I - r_dth * AD,
+        r_d * p_dth * p_d * p_h * I - r_dth * DHD,
+        r_d * p_dth * p_d * (1 - p_h) * I - r_dth * DQD,
+        r_ri * (AR + DQR) + r_rh * DHR,
+        r_dth * (AD + DQD + DHD),
+        r_d * p_d * p_h * I,
+        r_d * (1 - p_dth) * p_d * p_h * p_v * I - r_rv * DVR,
+        r_d * p_dth * p_d * p_h * p_v * I - r_dth * DVD,
+        r_dth * (DHD + DQD),
+        r_d * p_d * I,
+    ])
+
+# State on the first day of data, from the detected cases and deaths on that day
+def get_initial_state(cases, deaths, N, p_dth, k1, k2):
+    recovered = np.where(cases - deaths > 5 * deaths, 5 * deaths, 0)
+    CI = cases - deaths - recovered
+    return np.stack([
+        N - CI / p_d * (1 + k1 + k2) - recovered / p_d - deaths / p_d,
+        CI / p_d * k1,
+        CI / p_d * k2,
+        (CI / p_d - CI) * (1 - p_dth),
+        CI * p_h * (1 - p_dth),
+        CI * (1 - p_h) * (1 - p_dth),
+        (CI / p_d - CI) * p_dth,
+        CI * p_h * p_dth,
+        CI * (1 - p_h) * p_dth,
+        recovered / p_d,
+        deaths / p_d,
+        CI * p_h,
+        CI * p_h * p_v * (1 - p_dth),
+        CI * p_h * p_v * p_dth,
+        deaths,
+        cases,
+    ])
+
+def integrate(params, x_0, N, t):
+    alpha, days, r_s, r_dth, p_dth = params.T[:5]
+    solution = solve_ivp(
+        get_derivatives, (t[0], t[-1]), x_0.ravel(), t_eval=t,
+        args=(alpha, days, r_s, r_dth, p_dth, N), rtol=1e-5
+    )
+    return solution.y.reshape(n_compartments, len(N), len(t))
+
+# params: (system, fitted_cols) array, replaced by `changed` from day `switch`
+# on; returns (compartment, system, day) for days 0..horizon after the first day of data
+def simulate(params, N, cases, deaths, horizon, changed=None, switch=0):
+    p_dth, k1, k2 = params.T[4:]
+    x_0 = get_initial_state(cases, deaths, N, p_dth, k1, k2)
+    if changed is None or switch >= horizon:
+        return integrate(params, x_0, N, np.arange(horizon + 1))
+    if switch <= 0:
+        return integrate(changed, x_0, N, np.arange(horizon + 1))
+    before = integrate(params, x_0, N, np.arange(switch + 1))
+    after = integrate(changed, before[:, :, -1], N, np.arange(switch, horizon + 1))
+    return np.concatenate([before, after[:, :, 1:]], axis=2)
+
+# Values of get_cols() from the compartments, as create_datasets_predictions does
+def get_outputs(x):
+    return {
+        'Total Detected': x[15],
+        'Active': x[4] + x[5] + x[7] + x[8],
+        'Active Hospitalized': x[4] + x[7],
+        'Cumulative Hospitalized': x[11],
+        'Total Detected Deaths': x[14],
+    }
+
+def get_published_outputs(x):
+    # the two series the published projections are matched on
+    return np.concatenate([x[15], x[14]], axis=-1)
+
+# x: (compartment, system, day), days: (system, published day)
+def get_log_error(x, days, target):
+    return np.log(np.maximum(get_published_outputs(np.take_along_axis(x, days[None], 2)), 1)) - target
+
+# The parameter files do not carry the detected cases and deaths each fit
+# started from, so they are recovered per location from the projections
+# published with the same run: a linear fit on two unit simulations, then
+# Gauss-Newton steps (on log cases and deaths) kept only where they help
+def calibrate(params, N, days, target, horizon, iterations=4, h=1e-3):
+    n = len(N)
+    basis = simulate(np.concatenate([params, params]), np.r_[N, N], np.ones(2*n), np.r_[np.zeros(n), np.full(n, 0.1)], horizon)
+    basis = get_published_outputs(np.take_along_axis(basis, np.concatenate([days, days])[None], 2))
+    A, B = basis[:n], (basis[n:] - basis[:n]) / 0.1
+    start = np.empty((n, 2))
+    for i in range(n):
+        weight = 1 / np.maximum(np.exp(target[i]), 1)
+        start[i] = nnls(np.stack([A[i] * weight, B[i] * weight], 1), np.exp(target[i]) * weight)[0]
+    log_cd = np.log(np.maximum(start, 1e-2))
+
+    def get_errors(log_cds):
+        k = len(log_cds) // n
+        x = simulate(np.tile(params, (k, 1)), np.tile(N, k), np.exp(log_cds[:, 0]), np.exp(log_cds[:, 1]), horizon)
+        error = get_log_error(x, np.tile(days, (k, 1)), np.tile(target, (k, 1)))
+        return error.reshape(k, n, -1)
+
+    for _ in range(iterations):
+        error = get_errors(np.concatenate([log_cd, log_cd + [h, 0], log_cd + [0, h]]))
+        J = np.stack([(error[1] - error[0]) / h, (error[2] - error[0]) / h], 2)
+        step = np.array([np.linalg.lstsq(J[i], -error[0, i], rcond=None)[0] for i in range(n)])
+        step = np.clip(np.nan_to_num(step), -3, 3)
+        candidate = get_errors(log_cd + step)[0]
+        better = (candidate**2).sum(1) < (error[0]**2).sum(1)
+        log_cd[better] += step[better]
+    return np.exp(log_cd)
+
+def build_delphi_store(vintage):
+    store = get_parameter_store()
+    locations = store['locations']
+    values = store['values'][vintage]
+    params = values[:, [parameter_cols.index(c) for c in fitted_cols]]
+    N = read_population().reindex(get_population_keys(locations)).values.astype(float)
+    start = pd.to_datetime(pd.Series(store['start_dates'][vintage]))
+    vintages = get_vintage_store()
+    published = np.datetime64(vintage, 'D')
+
+    # locations are simulated up to the last day published for them by the run
+    rows, days, target, horizon = [], [], [], []
+    for i in range(len(locations)):
+        if np.isnan(params[i]).any() or np.isnan(N[i]) or pd.isnull(start.iloc[i]):
+            continue
+        i_store = vintages['locations'].get(tuple(locations.iloc[i]))
+        if i_store is None:
+            continue
+        loc_rows = slice(vintages['starts'][i_store], vintages['starts'][i_store+1])
+        vintage_rows = np.flatnonzero(vintages['vintage'][loc_rows] == published) + loc_rows.start
+        if len(vintage_rows) == 0:
+            continue
+        published_days = ((vintages['day'][vintage_rows] - np.datetime64(start.iloc[i], 'D')) // np.timedelta64(1, 'D')).astype(int)
+        vintage_rows = vintage_rows[published_days >= 0]
+        published_days = published_days[published_days >= 0]
+        if len(vintage_rows) == 0:
+            continue
+        rows.append(i)
+        days.append(published_days)
+        horizon.append(published_days.max())
+        target.append(np.log(np.maximum(np.concatenate([
+            vintages['value Total Detected'][vintage_rows],
+            vintages['value Total Detected Deaths'][vintage_rows],
+        ]), 1)))
+    rows = np.array(rows, dtype=int)
+    horizon = np.array(horizon, dtype=int)
+    if len(rows) == 0:
+        # no projections of this run to calibrate on
+        cases_deaths = np.empty((0, 2))
+    else:
+        # the same published days for every location, so they can be fitted together
+        n_days = min(len(d) for d in days)
+        days = np.array([d[:n_days] for d in days])
+        target = np.array([np.r_[t[:len(t)//2][:n_days], t[len(t)//2:][:n_days]] for t in target])
+        cases_deaths = calibrate(params[rows], N[rows], days, target, int(horizon.max()))
+    return {
+        'vintage': vintage,
+        'locations': {tuple(locations.iloc[i]): j for j, i in enumerate(rows)},
+        'params': params[rows],
+        'N': N[rows],
+        'cases': cases_deaths[:, 0],
+        'deaths': cases_deaths[:, 1],
+        'start': start.values[rows],
+        'horizon': horizon,
+    }
+
+# Calibrated starting points of one run, built on first use
+def get_delphi_store(vintage):
+    return load_cached(
+        'delphi ' + vintage,
+        get_parameter_paths() + get_snapshot_paths() + [population_path],
+        lambda: build_delphi_store(vintage)
+    )
+
+# Simulations keyed on everything they depend on, so the same parameters are
+# never integrated twice
+@lru_cache(maxsize=1024)
+def simulate_cached(params, changed, N, cases, deaths, horizon, switch):
+    x = simulate(np.array(params), np.array(N), np.array(cases), np.array(deaths), horizon, np.array(changed), switch)
+    outputs = get_outputs(x)
+    for v in outputs.values():
+        v.setflags(write=False)
+    return outputs
+
+# Projections of a location when its fitted parameters change on the day of
+# the run: each of `changes` is a {parameter: multiplier} dict (a shift in days
+# for "Median Day of Action"), and all of them are integrated in one solve.
+# One frame with the get_cols() columns per change.
+def get_what_if(location, vintage, changes):
+    store = get_delphi_store(vintage)
+    i = store['locations'].get(location)
+    if i is None:
+        return None
+    n = len(changes)
+    params = np.tile(store['params'][i], (n, 1))
+    changed = params.copy()
+    for k, change in enumerate(changes):
+        for col, value in change.items():
+            j = fitted_cols.index(col)
+            if col == "Median Day of Action":
+                changed[k, j] += value
+            else:
+                changed[k, j] *= value
+    start = pd.Timestamp(store['start'][i])
+    outputs = simulate_cached(
+        tuple(map(tuple, params)), tuple(map(tuple, np.round(changed, 8))),
+        (store['N'][i],) * n, (store['cases'][i],) * n, (store['deaths'][i],) * n,
+        int(store['horizon'][i]), (pd.Timestamp(vintage) - start).days
+    )
+    day = pd.date_range(start, periods=int(store['horizon'][i]) + 1)
+    return [
+        pd.DataFrame(dict({'Day': day}, **{c: np.round(outputs[c][k]) for c in get_cols()}))
+        for k in range(n)
+    ]
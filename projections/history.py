@@ -0,0 +1,153 @@
+import os
+import re
+import sys
+import glob
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from projections.utils import get_location_cols
+
+# History of the Global_YYYYMMDD.csv snapshots as one .npz per vintage. Every
+# keyframe_interval-th vintage is stored whole; the others only hold what
+# changed since the previous vintage: the rows that were removed, the rows that
+# were added, and for the rows both share the change of each value (zero, so
+# compressed away, when the value is unchanged).
+history_dir = 'data/predicted/history'
+snapshot_pattern = 'data/predicted/Global_*.csv'
+keyframe_interval = 7
+materialized_size = 8
+key_cols = get_location_cols() + ['Day']
+value_cols = ["Total Detected", "Active", "Active Hospitalized", "Cumulative Hospitalized", "Total Detected Deaths", "Active Ventilated"]
+
+def get_history_path(vintage):
+    return os.path.join(history_dir, 'Global_{}.npz'.format(vintage))
+
+def get_history_paths():
+    return sorted(glob.glob(os.path.join(history_dir, 'Global_*.npz')))
+
+def get_history_vintages():
+    return [re.search(r'_(\d{8})\.npz$', p).group(1) for p in get_history_paths()]
+
+def read_global_snapshot(path):
+    # 'None' marks aggregate rows, so it must not be parsed as a missing value
+    df = pd.read_csv(path, sep=",", keep_default_na=False, dtype={c: str for c in key_cols})
+    df = df[key_cols + value_cols]
+    df[value_cols] = df[value_cols].astype(float)
+    return df.sort_values(key_cols).reset_index(drop=True)
+
+def encode_table(df):
+    record = {'kind': np.array('full')}
+    for c in key_cols:
+        record[c] = df[c].values.astype(str)
+    record['values'] = df[value_cols].values
+    return record
+
+def encode_delta(prev, df):
+    # both tables are sorted by key, so the shared rows come in the same order
+    prev_rows = pd.MultiIndex.from_frame(prev[key_cols]).get_indexer(pd.MultiIndex.from_frame(df[key_cols]))
+    shared = prev_rows >= 0
+    kept = prev_rows[shared]
+    old = prev[value_cols].values[kept]
+    new = df[value_cols].values[shared]
+    change = new - old
+    # changes that do not add back up exactly (NaN, rounding) are stored as values
+    inexact = ~((old + change == new) | (np.isnan(old) & np.isnan(new)))
+    change[inexact | np.isnan(change)] = 0
+    override_rows, override_cols = np.nonzero(inexact)
+    added = df.loc[~shared]
+    record = {
+        'kind': np.array('delta'),
+        'removed': np.setdiff1d(np.arange(len(prev)), kept).astype(np.int32),
+        'override_rows': override_rows.astype(np.int32),
+        'override_cols': override_cols.astype(np.int8),
+        'override_values': new[override_rows, override_cols],
+        'values': added[value_cols].values,
+    }
+    # whole numbers, as the model outputs, compress far better as integers
+    integral = change.astype(np.int64)
+    record['change'] = integral if (integral == change).all() else change
+    for c in key_cols:
+        record[c] = added[c].values.astype(str)
+    return record
+
+def decode_table(record):
+    df = pd.DataFrame({c: record[c].astype(object) for c in key_cols})
+    df[value_cols] = pd.DataFrame(record['values'], columns=value_cols)
+    return df
+
+def decode_delta(prev, record):
+    keep = np.ones(len(prev), dtype=bool)
+    keep[record['removed']] = False
+    kept = prev.loc[keep, key_cols].reset_index(drop=True)
+    values = prev[value_cols].values[keep] + record['change']
+    values[record['override_rows'], record['override_cols']] = record['override_values']
+    kept[value_cols] = pd.DataFrame(values, columns=value_cols)
+    df = pd.concat([kept, decode_table(record)], ignore_index=True)
+    return df.sort_values(key_cols).reset_index(drop=True)
+
+def read_record(path):
+    with np.load(path) as f:
+        return {key: f[key] for key in f.files}
+
+# Materialized vintages, keyed by position in the history and file mtime; a
+# vintage is rebuilt from the closest keyframe or cached earlier vintage
+@lru_cache(maxsize=materialized_size)
+def materialize(i, path, mtime):
+    record = read_record(path)
+    if str(record['kind']) == 'full':
+        return decode_table(record)
+    prev_path = get_history_paths()[i-1]
+    return decode_delta(materialize(i-1, prev_path, os.path.getmtime(prev_path)), record)
+
+# Table of one vintage ('YYYYMMDD'), sorted by location and day
+def read_history_vintage(vintage):
+    paths = get_history_paths()
+    path = get_history_path(vintage)
+    if path not in paths:
+        raise KeyError(vintage)
+    return materialize(paths.index(path), path, os.path.getmtime(path)).copy()
+
+def write_record(record, path):
+    # written to a temporary file first so concurrent workers never see a partial file
+    tmp_path = '{}.{}.tmp.npz'.format(path[:-len('.npz')], os.getpid())
+    np.savez_compressed(tmp_path, **record)
+    os.replace(tmp_path, path)
+
+# Appends the snapshots newer than the last stored vintage to the history
+def append_snapshots(paths):
+    os.makedirs(history_dir, exist_ok=True)
+    vintages = get_history_vintages()
+    prev = read_history_vintage(vintages[-1]) if vintages else None
+    written = []
+    for path in sorted(paths):
+        vintage = re.search(r'_(\d{8})\.csv$', path).group(1)
+        if vintages and vintage <= vintages[-1]:
+            continue
+        df = read_global_snapshot(path)
+        if prev is None or (len(vintages) + len(written)) % keyframe_interval == 0:
+            record = encode_table(df)
+        else:
+            record = encode_delta(prev, df)
+        write_record(record, get_history_path(vintage))
+        written.append(vintage)
+        prev = df
+    return written
+
+# python -m projections.history [--prune]
+# Stores the new Global_YYYYMMDD.csv snapshots; with --prune, removes each CSV
+# once the vintage read back from the history matches it
+if __name__ == '__main__':
+    snapshots = [p for p in glob.glob(snapshot_pattern) if re.search(r'_\d{8}\.csv$', p)]
+    written = append_snapshots(snapshots)
+    csv_size = sum(os.path.getsize(p) for p in snapshots)
+    history_size = sum(os.path.getsize(p) for p in get_history_paths())
+    print('{} vintages written, history {:.1f} MB for {:.1f} MB of snapshots'.format(
+        len(written), history_size/1e6, csv_size/1e6))
+    if '--prune' in sys.argv:
+        for path in snapshots:
+            vintage = re.search(r'_(\d{8})\.csv$', path).group(1)
+            if vintage in get_history_vintages():
+                pd.testing.assert_frame_equal(read_history_vintage(vintage), read_global_snapshot(path))
+                os.remove(path)
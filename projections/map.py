@@ -4,10 +4,11 @@ import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
 
-from projections.utils import get_cols, get_df_us, build_card, add_cases
+from map_animation import get_animation_toggle
+from projections.utils import get_cols, get_df_us, build_card, add_cases, get_map_scopes
 
 def get_top_visual():
-    map_locations = ['US', "Europe", "Asia", "North America", "South America", "Africa", 'World']
+    map_locations = get_map_scopes()
     cols = get_cols()
     oneWeekFromNow = datetime.date.today() + datetime.timedelta(days=7)
     df_us = get_df_us()
@@ -28,8 +29,8 @@ def get_top_visual():
                                                 html.Div(
                                                     dcc.DatePickerSingle(
                                                         id='us-map-date-picker-range',
-                                                        min_date_allowed=min(df_us.Day.values),
-                                                        max_date_allowed=max(df_us.Day.values),
+                                                        min_date_allowed=df_us.Day.min().date(),
+                                                        max_date_allowed=df_us.Day.max().date(),
                                                         date=oneWeekFromNow,
                                                         initial_visible_month=oneWeekFromNow,
                                                     ),
@@ -38,6 +39,7 @@ def get_top_visual():
                                             ),
                                         ]
                                     ),
+                                    get_animation_toggle('map-animation-projections'),
                                 ],
                             ),
                         ],
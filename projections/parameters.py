@@ -0,0 +1,104 @@
+import re
+import glob
+
+import numpy as np
+import pandas as pd
+
+from data_cache import load_cached
+from projections.utils import get_location_cols
+
+# Fitted DELPHI parameters of every location, one Parameters_Global_YYYYMMDD.csv
+# per model run. The runs are aligned on the union of their locations (NaN
+# where a run has no fit) and every column of every run is sorted once, so
+# ranking, filtering and comparing runs only index precomputed arrays.
+parameters_pattern = 'data/predicted/Parameters_Global_*.csv'
+parameter_cols = [
+    "Infection Rate", "Median Day of Action", "Rate of Action", "Rate of Death",
+    "Mortality Rate", "MAPE", "Internal Parameter 1", "Internal Parameter 2"
+]
+
+def get_parameter_paths():
+    return sorted(glob.glob(parameters_pattern))
+
+def get_parameter_vintage(path):
+    return pd.Timestamp(re.search(r'_(\d{8})\.csv$', path).group(1)).strftime('%Y-%m-%d')
+
+def read_parameters(path):
+    # 'None' marks aggregate rows, so it must not be parsed as a missing value
+    df = pd.read_csv(path, sep=",", keep_default_na=False)
+    df[parameter_cols] = df[parameter_cols].apply(pd.to_numeric, errors='coerce')
+    return df
+
+def get_location_names(locations):
+    name = locations['Province'].where(locations['Province'] != 'None', locations['Country'])
+    return name.where(name != 'None', locations['Continent'])
+
+def build_parameter_store(paths):
+    location_cols = get_location_cols()
+    runs = {get_parameter_vintage(p): read_parameters(p) for p in paths}
+    locations = pd.concat([df[location_cols] for df in runs.values()]) \
+        .drop_duplicates().sort_values(location_cols).reset_index(drop=True)
+    index = pd.MultiIndex.from_frame(locations)
+    values = {}
+    start_dates = {}
+    orders = {}
+    for vintage, df in runs.items():
+        df = df.set_index(location_cols).reindex(index)
+        values[vintage] = df[parameter_cols].values
+        start_dates[vintage] = df['Data Start Date'].values
+        for i, c in enumerate(parameter_cols):
+            # ascending, locations without a value last
+            orders[(vintage, c)] = np.argsort(values[vintage][:, i], kind='stable')
+    return {
+        'vintages': list(runs),
+        'locations': locations,
+        'names': get_location_names(locations).values,
+        'continents': {c: np.flatnonzero(locations['Continent'].values == c) for c in locations['Continent'].unique()},
+        'values': values,
+        'start_dates': start_dates,
+        'orders': orders,
+    }
+
+# Parameters read once per worker and again when a run is added or changed
+def get_parameter_store():
+    paths = get_parameter_paths()
+    return load_cached('delphi parameters', paths, lambda: build_parameter_store(paths))
+
+def get_change_col(col):
+    return 'Change in ' + col
+
+# Rows of one run, optionally with the change since another run, restricted to
+# a continent and ordered by one column (locations without a value last)
+def get_parameter_rows(vintage, compare=None, continent=None, sort_col=None, ascending=True):
+    store = get_parameter_store()
+    values = store['values'][vintage]
+    present = ~np.isnan(values).all(axis=1)
+    change = values - store['values'][compare] if compare in store['values'] else None
+
+    if sort_col in parameter_cols:
+        order = store['orders'][(vintage, sort_col)]
+        col = values[:, parameter_cols.index(sort_col)]
+    elif change is not None and sort_col in [get_change_col(c) for c in parameter_cols]:
+        col = change[:, [get_change_col(c) for c in parameter_cols].index(sort_col)]
+        order = np.argsort(col, kind='stable')
+    else:
+        order, col = np.arange(len(values)), None
+    if col is not None and not ascending:
+        valid = np.count_nonzero(~np.isnan(col))
+        order = np.concatenate([order[:valid][::-1], order[valid:]])
+
+    keep = present.copy()
+    if continent in store['continents']:
+        in_continent = np.zeros(len(values), dtype=bool)
+        in_continent[store['continents'][continent]] = True
+        keep &= in_continent
+    order = order[keep[order]]
+
+    df = store['locations'].iloc[order][['Continent']].copy()
+    df.insert(0, 'Location', store['names'][order])
+    df['Data Start Date'] = store['start_dates'][vintage][order]
+    for i, c in enumerate(parameter_cols):
+        df[c] = np.round(values[order, i], 4)
+        if change is not None:
+            df[get_change_col(c)] = np.round(change[order, i], 4)
+    return df
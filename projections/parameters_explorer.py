@@ -0,0 +1,385 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from textwrap import wrap
+import dash_core_components as dcc
+import dash_html_components as html
+import dash_bootstrap_components as dbc
+import dash_table
+
+from navbar import Navbar
+from footer import Footer
+
+from assets.mappings import get_colors
+from projections.utils import get_cols, get_location_cols, add_cases
+from projections.parameters import get_parameter_store, parameter_cols, get_change_col, get_location_names
+from projections.vintages import get_vintage_forecasts
+from projections.delphi import get_what_if
+
+# What-if sliders: a multiplier of the fitted value, or a shift in days
+what_if_sliders = [
+    ('what_if_infection', "Infection Rate", 'Infection rate (x fitted value):', 0.5, 1.5, 0.05, 1,
+     {0.5: '0.5x', 1: '1x', 1.5: '1.5x'}),
+    ('what_if_action_day', "Median Day of Action", 'Median day of action (days later):', -20, 20, 1, 0,
+     {-20: '-20', 0: '0', 20: '+20'}),
+    ('what_if_action_rate', "Rate of Action", 'Rate of action (x fitted value):', 0.5, 1.5, 0.05, 1,
+     {0.5: '0.5x', 1: '1x', 1.5: '1.5x'}),
+]
+
+def get_parameter_dropdown(id, title, options, value, clearable=False):
+    return dbc.Col(
+        [
+            html.H6(title),
+            dcc.Dropdown(
+                id = id,
+                options = [{'label': x, 'value': x} for x in options],
+                value = value,
+                clearable = clearable,
+                style={'marginBottom': 10}
+            ),
+        ],
+        xs=12,
+        sm=6,
+        md=3,
+        lg=3,
+    )
+
+def get_what_if_slider(id, title, min, max, step, value, marks):
+    return dbc.Col(
+        [
+            html.H6(title),
+            dcc.Slider(
+                id = id,
+                min = min,
+                max = max,
+                step = step,
+                value = value,
+                marks = marks,
+            ),
+        ],
+        xs=12,
+        sm=6,
+        md=4,
+        lg=4,
+    )
+
+# Locations go through the dropdowns as 'Continent|Country|Province'
+def get_location_value(location):
+    return '|'.join(location)
+
+def get_location_key(value):
+    return tuple(value.split('|')) if value else None
+
+def ParameterExplorer():
+    nav = Navbar()
+    footer = Footer()
+    store = get_parameter_store()
+    vintages = store['vintages']
+    locations = [get_location_value(l) for l in store['locations'].itertuples(index=False)]
+
+    body = dbc.Container(
+        [
+            dbc.Row(
+            [
+                dbc.Col(
+                [
+                    html.H2("DELPHI Model Parameters"),
+                    dcc.Markdown("""\
+                            Every location's projections come from a DELPHI model fitted to its \
+                            own case history. Below you can rank, filter and compare the fitted \
+                            parameters of each location, and see how they changed between two \
+                            runs of the model. See the [documentation](/projections_documentation) \
+                            for what each parameter means.
+                           """),
+                ]
+                ),
+            ],
+            ),
+            dbc.Row(
+            [
+                get_parameter_dropdown('parameters_vintage', 'Model run:', vintages, vintages[-1]),
+                get_parameter_dropdown('parameters_compare', 'Compared with:', vintages,
+                                       vintages[-2] if len(vintages) > 1 else None, clearable=True),
+                get_parameter_dropdown('parameters_continent', 'Continent:', sorted(store['continents']), None, clearable=True),
+            ],
+            style={'marginTop': 20},
+            ),
+            dbc.Row(
+            [
+                dbc.Col(
+                [
+                    html.Div(
+                        dash_table.DataTable(
+                            id='parameters-table',
+                            page_action='native',
+                            page_size=20,
+                            sort_action='custom',
+                            sort_mode='single',
+                            sort_by=[],
+                            style_table={'overflowX': 'auto'},
+                            style_cell={
+                                'textAlign': 'center',
+                                'font_size': '14px',
+                                'font-family': 'arial',
+                            },
+                            style_data_conditional=[
+                                {
+                                    'if': {'row_index': 'odd'},
+                                    'backgroundColor': 'rgb(248, 248, 248)'
+                                }
+                            ],
+                            style_header={
+                                'backgroundColor': 'rgb(230, 230, 230)',
+                                'fontWeight': 'bold',
+                                'whiteSpace': 'normal',
+                            },
+                        ),
+                    ),
+                ]
+                ),
+            ],
+            style={'marginTop': 20, 'marginBottom': 20},
+            ),
+            dbc.Row(
+            [
+                get_parameter_dropdown('parameters_x', 'Horizontal axis:', parameter_cols, "Infection Rate"),
+                get_parameter_dropdown('parameters_y', 'Vertical axis:', parameter_cols, "Mortality Rate"),
+            ],
+            ),
+            dbc.Row(
+            [
+                dbc.Col(
+                [
+                    html.Div(
+                        id = 'parameters_scatter',
+                        children = [],
+                    ),
+                ]
+                ),
+            ],
+            ),
+            dbc.Row(
+            [
+                dbc.Col(
+                [
+                    html.H4("What if?"),
+                    dcc.Markdown("""\
+                            Re-run the model of a location with some of its fitted parameters \
+                            changed from the day of the chosen run on, and compare the new curve \
+                            with the projections published that day.
+                           """),
+                ]
+                ),
+            ],
+            style={'marginTop': 20},
+            ),
+            dbc.Row(
+            [
+                dbc.Col(
+                [
+                    html.H6('Location:'),
+                    dcc.Dropdown(
+                        id = 'what_if_location',
+                        options = sorted(
+                            [{'label': name, 'value': value} for name, value in zip(store['names'], locations)],
+                            key=lambda x: x['label']
+                        ),
+                        value = get_location_value(('Europe', 'Italy', 'None')),
+                        clearable = False,
+                        style={'marginBottom': 10}
+                    ),
+                ],
+                xs=12,
+                sm=6,
+                md=3,
+                lg=3,
+                ),
+                get_parameter_dropdown('what_if_value', 'Predicted value:', list(get_cols()), 'Total Detected'),
+            ],
+            ),
+            dbc.Row(
+            [get_what_if_slider(id, title, *args) for id, _, title, *args in what_if_sliders],
+            style={'marginTop': 10},
+            ),
+            dbc.Row(
+            [
+                dbc.Col(
+                [
+                    html.Div(
+                        id = 'what_if_graph',
+                        children = [],
+                    ),
+                ]
+                ),
+            ],
+            ),
+        ],
+        className="page-body"
+    )
+
+    layout = html.Div([nav, body, footer],className="site")
+    return layout
+
+def get_parameter_columns(compare):
+    cols = ['Location', 'Continent', 'Data Start Date']
+    for c in parameter_cols:
+        cols.append(c)
+        if compare:
+            cols.append(get_change_col(c))
+    return [{'id': c, 'name': c} for c in cols]
+
+# One point per location and continent; with a second run, a faint line joins
+# each location's value in that run to its point in the chosen run
+def build_parameter_scatter(vintage, compare, continent, x_col, y_col):
+    store = get_parameter_store()
+    if vintage not in store['values'] or x_col not in parameter_cols or y_col not in parameter_cols:
+        return None
+    x_ind, y_ind = parameter_cols.index(x_col), parameter_cols.index(y_col)
+    values = store['values'][vintage]
+    previous = store['values'].get(compare) if compare != vintage else None
+    colors = get_colors()
+    fig = go.Figure()
+    continents = [continent] if continent in store['continents'] else sorted(store['continents'])
+    for i, c in enumerate(continents):
+        rows = store['continents'][c]
+        color = colors[i % len(colors)]
+        if previous is not None:
+            # segments from the compared run to the chosen one, separated by None
+            segments = np.full((len(rows), 3, 2), np.nan)
+            segments[:, 0] = previous[rows][:, [x_ind, y_ind]]
+            segments[:, 1] = values[rows][:, [x_ind, y_ind]]
+            fig.add_trace(go.Scatter(
+                x=segments[:, :, 0].ravel(),
+                y=segments[:, :, 1].ravel(),
+                mode="lines",
+                line=dict(color=color, width=1),
+                opacity=0.4,
+                legendgroup=c,
+                showlegend=False,
+                hoverinfo='skip',
+            ))
+        fig.add_trace(go.Scatter(
+            x=values[rows, x_ind],
+            y=values[rows, y_ind],
+            name=c if c != 'None' else 'World',
+            legendgroup=c,
+            mode="markers",
+            marker=dict(color=color, size=8),
+            text=store['names'][rows],
+        ))
+
+    fig.update_layout(
+                height=550,
+                title={
+                    'text': '<br>'.join(wrap('<b> {} vs {} </b>'.format(x_col, y_col), width=40)),
+                    'y':0.97,
+                    'x':0.5,
+                    'xanchor': 'center',
+                    'yanchor': 'top'},
+                title_font_size=20,
+                xaxis={'title': x_col,'linecolor': 'lightgrey'},
+                yaxis={'title': y_col,'linecolor': 'lightgrey'},
+                margin={'l': 40, 'b': 40, 't': 40, 'r': 10},
+                hovermode='closest',
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                legend={
+                        "orientation": "h",
+                        "xanchor": "center",
+                        "y": -0.2,
+                        "x": 0.5,
+                        },
+                modebar={
+                    'orientation': 'v',
+                    'bgcolor': 'rgba(0,0,0,0)',
+                    'color': 'lightgray',
+                    'activecolor': 'gray'
+                }
+            )
+
+    graph = dcc.Graph(
+        id='parameters-graph',
+        figure=fig
+    )
+    return graph
+
+# Projections published with a run next to the re-simulated model, with and
+# without the changed parameters
+def build_what_if(location, vintage, val, values):
+    location = get_location_key(location)
+    if location is None or val not in get_cols():
+        return None
+    changes = {col: value for (_, col, *_), value in zip(what_if_sliders, values) if value is not None}
+    curves = get_what_if(location, vintage, [{}, changes])
+    if curves is None:
+        return html.Div("The model of this location cannot be re-run for this model run.")
+    baseline, what_if = curves
+    df = get_vintage_forecasts(location, val)
+    df = df[df['Vintage'] == np.datetime64(vintage, 'D')]
+    name = get_location_names(pd.DataFrame([location], columns=get_location_cols()))[0]
+    color = get_colors()[get_cols()[val]]
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        name='Published',
+        x=df['Day'],
+        y=df[val].values,
+        mode="lines",
+        line=dict(color=color, width=6),
+        opacity=0.3,
+    ))
+    fig.add_trace(go.Scatter(
+        name='Model',
+        x=baseline['Day'],
+        y=baseline[val].values,
+        mode="lines",
+        line=dict(color=color, width=2),
+    ))
+    fig.add_trace(go.Scatter(
+        name='What if',
+        x=what_if['Day'],
+        y=what_if[val].values,
+        mode="lines",
+        line=dict(color=color, width=2, dash='dash'),
+    ))
+    # the day the changes start
+    fig.add_shape(
+        type='line', xref='x', yref='paper',
+        x0=pd.Timestamp(vintage), x1=pd.Timestamp(vintage), y0=0, y1=1,
+        line=dict(color='lightgrey', dash='dot'),
+    )
+
+    fig.update_layout(
+                height=550,
+                title={
+                    'text': '<br>'.join(wrap('<b> {} for {} </b>'.format(add_cases(val), name), width=40)),
+                    'y':0.97,
+                    'x':0.5,
+                    'xanchor': 'center',
+                    'yanchor': 'top'},
+                title_font_size=20,
+                xaxis={'title': "Date",'linecolor': 'lightgrey'},
+                yaxis={'title': "Count",'linecolor': 'lightgrey'},
+                margin={'l': 40, 'b': 40, 't': 40, 'r': 10},
+                hovermode='x',
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                legend={
+                        "orientation": "h",
+                        "xanchor": "center",
+                        "y": -0.2,
+                        "x": 0.5,
+                        },
+                modebar={
+                    'orientation': 'v',
+                    'bgcolor': 'rgba(0,0,0,0)',
+                    'color': 'lightgray',
+                    'activecolor': 'gray'
+                }
+            )
+
+    graph = dcc.Graph(
+        id='what-if-graph',
+        figure=fig
+    )
+    return graph
@@ -122,6 +122,38 @@ def get_bottom_visual():
               ],
               )
         ] + \
+        [
+            dbc.Row(
+            [
+                dbc.Col(
+                [
+                    html.H5('How have our predictions changed?'),
+                    dcc.Markdown("Each line below is the forecast we published on one day \
+                                 for the location chosen above, the most recent one in bold."),
+                    html.Div(
+                        dcc.Dropdown(
+                            id = 'revisions_value',
+                            options = [{'label': add_cases(x), 'value': x} for x in cols.keys()],
+                            value = 'Active',
+                            clearable=False,
+                        ),
+                        style={'width': '50%'},
+                    ),
+                    html.Div(
+                        id = 'forecast_revisions_graph',
+                        children = [],
+                        style={
+                            'width': '100%',
+                            'display': 'inline-block',
+                            'paddingTop': 20,
+                            }
+                    ),
+                ]
+                )
+            ],
+            style={'marginTop':20},
+            )
+        ] + \
         [
              dbc.Row([
                 dbc.Col(
@@ -1,13 +1,141 @@
+import itertools
+import numpy as np
 import pandas as pd
 
 import dash_bootstrap_components as dbc
 
+from data_cache import load_cached
+
+projections_path = 'data/predicted/Global.csv'
+population_path = 'data/predicted/WorldPopulationInformation.csv'
+world_location = ('None', 'None', 'None')
+store_versions = itertools.count()
+
+def get_today():
+    return pd.Timestamp('today')
+
+def get_location_cols():
+    return ['Continent', 'Country', 'Province']
+
+def get_map_scopes():
+    return ['US', "Europe", "Asia", "North America", "South America", "Africa", 'World']
+
+def read_projections(path=projections_path):
+    dtypes = {c: 'category' for c in get_location_cols()}
+    dtypes.update({c: 'int64' for c in get_cols()})
+    # 'None' marks aggregate rows, so it must not be parsed as a missing value
+    df = pd.read_csv(path, sep=",", parse_dates=['Day'], dtype=dtypes, keep_default_na=False)
+    # each location's time series becomes one contiguous, date-sorted block of rows
+    return df.sort_values(get_location_cols() + ['Day']).reset_index(drop=True)
+
+def get_per_million_cols():
+    return {c: c + ' Per Million' for c in get_cols()}
+
+def get_population_keys(df):
+    # countries and provinces are matched by name alone, aggregate rows by continent
+    continent = df['Continent'].astype(str).where(df['Country'] == 'None', 'None')
+    return pd.MultiIndex.from_arrays([continent, df['Country'].astype(str), df['Province'].astype(str)])
+
+def read_population(path=population_path):
+    df = pd.read_csv(path, sep=",", keep_default_na=False)
+    return pd.Series(df['pop'].values, index=get_population_keys(df))
+
+def add_population(df, population):
+    df['Population'] = population.reindex(get_population_keys(df)).values
+    for col, per_million_col in get_per_million_cols().items():
+        df[per_million_col] = np.round(1000000*df[col]/df['Population'], decimals = 2)
+    return df
+
+def add_hover_text(df):
+    name = df['Province'].astype(str).where(df['Province'] != 'None', df['Country'].astype(str))
+    per_million_cols = get_per_million_cols()
+    for suffix, cols in [('', list(per_million_cols.keys())), (' Per Million', list(per_million_cols.values()))]:
+        text = name
+        for col in cols:
+            text = text + '<br>' + col + ' ' + df[col].astype(str)
+        df['Hover Text' + suffix] = text
+    return df
+
+def index_by_day(df, mask):
+    positions = np.flatnonzero(mask)
+    groups = pd.Series(positions).groupby(df['Day'].values[positions]).indices
+    return {pd.Timestamp(day): positions[ind] for day, ind in groups.items()}
+
+def build_projection_store(df):
+    # (Continent, Country, Province) -> slice of rows
+    groups = df.groupby(get_location_cols(), observed=True, sort=False).indices
+    locations = {tuple(k): slice(ind[0], ind[-1] + 1) for k, ind in groups.items()}
+    continents = {(k[1], k[2]): k[0] for k in locations if k[1] != 'None'}
+
+    # (map scope, day) -> rows drawn on that map
+    countries = (df.Province == 'None') & (df.Country != 'None')
+    maps = {}
+    for scope in get_map_scopes():
+        if scope == 'US':
+            mask = (df.Country == 'US') & (df.Province != 'None')
+        elif scope == 'World':
+            mask = countries
+        else:
+            mask = countries & (df.Continent == scope)
+        for day, rows in index_by_day(df, mask).items():
+            maps[(scope, day)] = rows
+
+    return {
+        'version': next(store_versions),
+        'df': df,
+        'days': df['Day'].values,
+        'locations': locations,
+        'continents': continents,
+        'maps': maps,
+    }
+
+# Projection table and its index, built once per worker and rebuilt when the data files change
+def get_projection_store():
+    return load_cached(
+        'projections',
+        [projections_path, population_path],
+        lambda: build_projection_store(add_hover_text(add_population(read_projections(), read_population())))
+    )
+
+def get_df_all_projections():
+    return get_projection_store()['df']
+
 def get_df_projections():
-    df_projections = pd.read_csv('data/predicted/Global.csv', sep=",", parse_dates = ['Day'])
-    df_projections.loc[:,'Day'] = pd.to_datetime(df_projections['Day'], format='y%m%d').dt.date
-    today = pd.Timestamp('today')
-    df_projections = df_projections.loc[df_projections['Day']>=today]
-    return df_projections
+    df_projections = get_df_all_projections()
+    return df_projections.loc[df_projections['Day']>=get_today()]
+
+def find_location(country, province='None'):
+    continent = get_projection_store()['continents'].get((country, province))
+    return (continent, country, province) if continent is not None else None
+
+def get_location_projections(location):
+    store = get_projection_store()
+    df = store['df']
+    rows = store['locations'].get(location)
+    if rows is None:
+        return df.iloc[0:0]
+    start = rows.start + np.searchsorted(store['days'][rows], np.datetime64(get_today()))
+    return df.iloc[start:rows.stop]
+
+def get_location_projection_on(location, day):
+    store = get_projection_store()
+    rows = store['locations'].get(location)
+    day = pd.Timestamp(day)
+    if rows is None or day < get_today():
+        return None
+    i = rows.start + np.searchsorted(store['days'][rows], np.datetime64(day))
+    if i >= rows.stop or store['days'][i] != np.datetime64(day):
+        return None
+    return store['df'].iloc[i]
+
+def get_map_projections(scope, day):
+    store = get_projection_store()
+    df = store['df']
+    day = pd.Timestamp(day)
+    rows = store['maps'].get((scope, day))
+    if rows is None or day < get_today():
+        return df.iloc[0:0]
+    return df.iloc[rows]
 
 def get_df_us():
     df_projections = get_df_projections()
@@ -0,0 +1,137 @@
+import os
+import re
+import glob
+
+import numpy as np
+import pandas as pd
+
+from data_cache import load_cached
+from projections.utils import get_location_cols
+from projections.history import get_history_paths, read_history_vintage, value_cols
+
+# Every dated snapshot of the projections (Allstates_YYYYMMDD.csv for the first
+# US-only runs, then Global_YYYYMMDD.csv or its vintage in projections.history)
+# in one compressed columnar archive.
+# Rows are sorted by (location, day, vintage), so the forecasts of a location,
+# and of a location and day across vintages, are contiguous slices.
+snapshot_patterns = ['data/predicted/Allstates_*.csv', 'data/predicted/Global_*.csv']
+archive_path = 'data/predicted/vintages.npz'
+
+def get_snapshot_paths():
+    paths = [p for pattern in snapshot_patterns for p in glob.glob(pattern)]
+    paths = [p for p in paths if re.search(r'_\d{8}\.csv$', p)]
+    # vintages whose CSV was pruned after being stored in the history
+    stored = set(get_vintage(p) for p in paths)
+    paths += [p for p in get_history_paths() if get_vintage(p) not in stored]
+    return sorted(paths, key=get_vintage)
+
+def get_vintage(path):
+    return np.datetime64(pd.Timestamp(re.search(r'_(\d{8})\.(csv|npz)$', path).group(1)), 'D')
+
+def read_snapshot(path):
+    if path.endswith('.npz'):
+        return read_history_vintage(re.search(r'_(\d{8})\.npz$', path).group(1))
+    # 'None' marks aggregate rows, so it must not be parsed as a missing value
+    df = pd.read_csv(path, sep=",", keep_default_na=False)
+    if 'State' in df:
+        df = df.rename(columns={'State': 'Province'})
+        df['Continent'] = 'North America'
+        df['Country'] = 'US'
+    for c in value_cols:
+        if c not in df:
+            df[c] = np.nan
+    return df
+
+def build_vintage_archive(paths):
+    df = pd.concat(
+        [read_snapshot(p).assign(Vintage=get_vintage(p)) for p in paths],
+        ignore_index=True, sort=False
+    )
+    location_cols = get_location_cols()
+    locations = df[location_cols].drop_duplicates().sort_values(location_cols)
+    location = pd.MultiIndex.from_frame(locations).get_indexer(pd.MultiIndex.from_frame(df[location_cols]))
+    day = pd.to_datetime(df['Day']).values.astype('datetime64[D]')
+    vintage = df['Vintage'].values.astype('datetime64[D]')
+    order = np.lexsort((vintage, day, location))
+    archive = {
+        'vintages': np.array([get_vintage(p) for p in paths]),
+        'location': location[order].astype(np.int32),
+        'day': day[order],
+        'vintage': vintage[order],
+    }
+    for c in location_cols:
+        archive['location ' + c] = locations[c].values.astype(str)
+    for c in value_cols:
+        archive['value ' + c] = df[c].values[order].astype(float)
+    return archive
+
+def write_vintage_archive(archive, path=archive_path):
+    # written to a temporary file first so concurrent workers never see a partial file
+    tmp_path = '{}.{}.tmp.npz'.format(path[:-len('.npz')], os.getpid())
+    np.savez_compressed(tmp_path, **archive)
+    os.replace(tmp_path, path)
+
+def read_vintage_archive(path=archive_path):
+    with np.load(path) as f:
+        return {key: f[key] for key in f.files}
+
+def is_archive_fresh(paths, path=archive_path):
+    return os.path.exists(path) and all(os.path.getmtime(path) >= os.path.getmtime(p) for p in paths)
+
+def load_vintage_archive(paths):
+    if is_archive_fresh(paths):
+        archive = read_vintage_archive()
+        if len(archive['vintages']) == len(paths):
+            return archive
+    archive = build_vintage_archive(paths)
+    try:
+        write_vintage_archive(archive)
+    except OSError:
+        pass
+    return archive
+
+def build_vintage_store(archive):
+    location_cols = get_location_cols()
+    keys = zip(*[archive['location ' + c] for c in location_cols])
+    # location -> first row, rows of location i are starts[i]:starts[i+1]
+    starts = np.searchsorted(archive['location'], np.arange(len(archive['location ' + location_cols[0]]) + 1))
+    return dict(archive, locations={key: i for i, key in enumerate(keys)}, starts=starts)
+
+# Archive read once per worker and again when a snapshot is added or changed;
+# it is rebuilt from the CSVs (and rewritten) only when it is older than them
+def get_vintage_store():
+    paths = get_snapshot_paths()
+    return load_cached('projection vintages', paths, lambda: build_vintage_store(load_vintage_archive(paths)))
+
+def get_location_rows(store, location):
+    i = store['locations'].get(location)
+    if i is None:
+        return slice(0, 0)
+    return slice(store['starts'][i], store['starts'][i+1])
+
+# Forecasts of a location by every vintage: Vintage, Day and the value
+def get_vintage_forecasts(location, val):
+    store = get_vintage_store()
+    rows = get_location_rows(store, location)
+    return pd.DataFrame({
+        'Vintage': store['vintage'][rows],
+        'Day': store['day'][rows],
+        val: store['value ' + val][rows],
+    })
+
+# How the forecast of a location for one day changed across vintages
+def get_forecast_revisions(location, day, val):
+    store = get_vintage_store()
+    rows = get_location_rows(store, location)
+    day = np.datetime64(pd.Timestamp(day), 'D')
+    start, stop = rows.start + np.searchsorted(store['day'][rows], [day, day + 1])
+    return pd.DataFrame({
+        'Vintage': store['vintage'][start:stop],
+        val: store['value ' + val][start:stop],
+    })
+
+# Builds the archive ahead of deploying: python -m projections.vintages
+if __name__ == '__main__':
+    paths = get_snapshot_paths()
+    write_vintage_archive(build_vintage_archive(paths))
+    print('{} vintages written to {}'.format(len(paths), archive_path))
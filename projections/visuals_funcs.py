@@ -1,6 +1,8 @@
 import datetime
-import pandas as pd
+import json
+from functools import lru_cache
 import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 from textwrap import wrap
 
@@ -9,167 +11,80 @@ import dash_html_components as html
 import dash_bootstrap_components as dbc
 
 from assets.mappings import get_states, get_colors
-from projections.utils import get_cols, get_df_us, add_cases, get_df_projections
-
-def build_continent_map(map_date,val='Active', continent = 'World', pop = 1):
-    df_continent = get_df_projections()
-    if continent !='World':
-        df_continent = df_continent.loc[df_continent.Continent == continent] #Filter by continent
-
-    if map_date is None:
-        return None
+from map_animation import add_date_frames, select_frame
+from projections.utils import get_cols, add_cases, world_location, get_per_million_cols, get_map_scopes, get_today
+from projections.utils import get_projection_store
+from projections.utils import find_location, get_location_projections, get_location_projection_on, get_map_projections
+from projections.vintages import get_vintage_forecasts
 
+def get_map_date(map_date):
     if isinstance(map_date, str):
         map_date = datetime.datetime.strptime(map_date, '%Y-%m-%d').date()
+    return pd.Timestamp(map_date)
 
-    df_map = df_continent.loc[df_continent['Day'] == map_date]
-    df_map = df_map.loc[df_map['Province'] == 'None'] #exclude province data
-    df_map = df_map.loc[df_map['Country'] != 'None'] #exclude global world data
-
-    population = np.array([])
-    PopInfo = pd.read_csv('data/predicted/WorldPopulationInformation.csv', sep=",")
-
-    for i in df_map['Country']:
-        ind1 = np.logical_and(PopInfo['Country']==i, PopInfo['Province']=='None')
-        pop_val = PopInfo.loc[ind1,'pop'].values
-        population = np.concatenate((population, pop_val),0)
-
-    df_map['Population'] =population
-
-    df_map['Active Per Million'] = (np.round(1000000*df_map['Active']/df_map['Population'], decimals = 2))
-    df_map['Total Detected Per Million'] = (np.round(1000000*df_map['Total Detected']/df_map['Population'], decimals = 2))
-    df_map['Active Hospitalized Per Million'] = (np.round(1000000*df_map['Active Hospitalized']/df_map['Population'], decimals = 2))
-    df_map['Cumulative Hospitalized Per Million'] = (np.round(1000000*df_map['Cumulative Hospitalized']/df_map['Population'], decimals = 2))
-    df_map['Total Detected Deaths Per Million'] = (np.round(1000000*df_map['Total Detected Deaths']/df_map['Population'], decimals = 2))
-    df_map = df_map.applymap(str)
+def build_continent_map(map_date,val='Active', continent = 'World', pop = 1):
+    if map_date is None:
+        return None
 
     cols = get_cols()
-    if (val is not None) and (val in cols) and  pop == 1:
-
-        df_map.loc[:,'text'] = df_map['Country'] + '<br>' + \
-                    'Total Detected ' + df_map['Total Detected'] + '<br>' + \
-                    'Active ' + df_map['Active'] + '<br>' + \
-                    'Active Hospitalized ' + df_map['Active Hospitalized'] + '<br>' + \
-                    'Cumulative Hospitalized ' + df_map['Cumulative Hospitalized'] + '<br>' + \
-                    'Total Detected Deaths ' + df_map['Total Detected Deaths']
-        zval = df_map[val].astype(float)
-
-    if (val is not None) and (val in cols) and  pop != 1:
-
-        df_map.loc[:,'text'] = df_map['Country'] + '<br>' + \
-                    'Total Detected Per Million ' + df_map['Total Detected Per Million'] + '<br>' + \
-                    'Active Per Million ' + df_map['Active Per Million'] + '<br>' + \
-                    'Active Hospitalized Per Million ' + df_map['Active Hospitalized Per Million'] + '<br>' + \
-                    'Cumulative Hospitalized Per Million ' + df_map['Cumulative Hospitalized Per Million'] + '<br>' + \
-                    'Total Detected Deaths Per Million ' + df_map['Total Detected Deaths Per Million']
-
-
-        zval = df_map[val+ " Per Million"].astype(float)
-
     if (val is not None) and (val in cols):
-        fig = go.Figure(data=go.Choropleth(
-            locations=df_map['Country'],
-            z= zval,
-            locationmode="country names",
-            autocolorscale=False,
-            colorscale='inferno_r',
-            text=df_map['text'], # hover text
-            marker_line_color='black', # line markers between states
-            colorbar_title='<br>'.join(wrap(''.join(['{}'.format(add_cases(val))]), width=10))
-        ))
-
-        fig.update_layout(
-                margin=dict(l=10, r=10, t=50, b=50),
-                title_text=add_cases('{} Predicted {} {}'.format(map_date.strftime('%b %d,%Y'), continent, val)),
-                geo = dict(
-                    scope= continent.lower() if continent is not None else None,
-                    projection=go.layout.geo.Projection(type = 'natural earth'),
-                    showlakes=True, # lakes
-                    lakecolor='rgb(255, 255, 255)',
-                    countrycolor='lightgray',
-                    landcolor='whitesmoke',
-                    showland=True,
-                    showframe = False,
-                    showcoastlines = True,
-                    showcountries=True,
-                    visible = False,
-                ),
-                modebar={
-                    'orientation': 'v',
-                    'bgcolor': 'rgba(0,0,0,0)',
-                    'color': 'lightgray',
-                    'activecolor': 'gray'
-                }
-            )
-
         graph = dcc.Graph(
             id='continent-projection-map',
-            figure=fig,
+            figure=get_map_figure(continent, get_map_date(map_date), val, pop),
         )
 
         return graph
     return
 
-
 def build_us_map(map_date,val='Active', pop = 1):
     if map_date is None:
         return None
 
-    if isinstance(map_date, str):
-        map_date = datetime.datetime.strptime(map_date, '%Y-%m-%d').date()
-
-    df_us = get_df_us()
-    df_map = df_us.loc[df_us['Day']==map_date]
-    df_map = df_map.loc[df_us['Province']!='US']
-
-    states = get_states()
-    df_map.loc[:,'code'] = df_map.Province.apply(lambda x: states[x])
-    population = np.array([])
-    PopInfo = pd.read_csv('data/predicted/WorldPopulationInformation.csv', sep=",")
-
-    for i in df_map['Province']:
-        pop_val = PopInfo.loc[PopInfo['Province']==i,'pop'].values
-        population = np.concatenate((population, pop_val),0)
-
-    df_map['Population'] =population
-    df_map['Active Per Million'] = (np.round(1000000*df_map['Active']/df_map['Population'], decimals = 2))
-    df_map['Total Detected Per Million'] = (np.round(1000000*df_map['Total Detected']/df_map['Population'], decimals = 2))
-    df_map['Active Hospitalized Per Million'] = (np.round(1000000*df_map['Active Hospitalized']/df_map['Population'], decimals = 2))
-    df_map['Cumulative Hospitalized Per Million'] = (np.round(1000000*df_map['Cumulative Hospitalized']/df_map['Population'], decimals = 2))
-    df_map['Total Detected Deaths Per Million'] = (np.round(1000000*df_map['Total Detected Deaths']/df_map['Population'], decimals = 2))
-    df_map = df_map.applymap(str)
-
     cols = get_cols()
-    if (val is not None) and (val in cols) and pop == 1:
+    if (val is not None) and (val in cols):
+        graph = dcc.Graph(
+            id='us-projection-map',
+            figure=get_map_figure('US', get_map_date(map_date), val, pop)
+        )
+        return graph
+    return
 
-        df_map.loc[:,'text'] = df_map['Province'] + '<br>' + \
-                    'Total Detected ' + df_map['Total Detected'] + '<br>' + \
-                    'Active ' + df_map['Active'] + '<br>' + \
-                    'Active Hospitalized ' + df_map['Active Hospitalized'] + '<br>' + \
-                    'Cumulative Hospitalized ' + df_map['Cumulative Hospitalized'] + '<br>' + \
-                    'Total Detected Deaths ' + df_map['Total Detected Deaths']
+def get_map_figure(scope, map_date, val, pop):
+    return get_cached_map_figure(scope, map_date, val, pop, get_today().normalize(), get_projection_store()['version'])
 
-        z_val = df_map[val].astype(float)
+# Serialized map figures, one per (scope, date, value, population type).
+# Figures of a previous day or projection store are keyed on them and age out of the LRU.
+@lru_cache(maxsize=1024)
+def get_cached_map_figure(scope, map_date, val, pop, today, version):
+    df_map = get_map_projections(scope, map_date)
+    z_col, text_col = get_map_cols(val, pop)
+    title = get_map_title(scope, map_date, val)
+    fig = build_map_figure(scope, df_map[get_map_location_col(scope)], df_map[z_col], df_map[text_col], val, title)
+    return json.loads(fig.to_json())
 
+def get_map_cols(val, pop):
+    if pop == 1:
+        return val, 'Hover Text'
+    return get_per_million_cols()[val], 'Hover Text Per Million'
 
-    if (val is not None) and (val in cols) and pop != 1:
+def get_map_location_col(scope):
+    return 'Province' if scope == 'US' else 'Country'
 
-        df_map.loc[:,'text'] = df_map['Province'] + '<br>' + \
-            'Total Detected Per Million ' + df_map['Total Detected Per Million'] + '<br>' + \
-            'Active Per Million ' + df_map['Active Per Million'] + '<br>' + \
-            'Active Hospitalized Per Million ' + df_map['Active Hospitalized Per Million'] + '<br>' + \
-            'Cumulative Hospitalized Per Million ' + df_map['Cumulative Hospitalized Per Million'] + '<br>' + \
-            'Total Detected Deaths Per Million ' + df_map['Total Detected Deaths Per Million']
-        z_val =df_map[val+ " Per Million"].astype(float)
+def get_map_title(scope, map_date, val):
+    if scope == 'US':
+        return add_cases('{} Predicted US {}'.format(map_date.strftime('%b %d,%Y'), val))
+    return add_cases('{} Predicted {} {}'.format(map_date.strftime('%b %d,%Y'), scope, val))
 
-    if (val is not None) and (val in cols):
+def build_map_figure(scope, locations, z_val, text, val, title, zmax=None):
+    if scope == 'US':
+        states = get_states()
         fig = go.Figure(data=go.Choropleth(
-            locations=df_map['code'],
+            locations=locations.astype(str).map(states),
             z=z_val,
             locationmode='USA-states',
             colorscale='inferno_r',
             autocolorscale=False,
-            text=df_map['text'], # hover text
+            text=text, # hover text
             marker_line_color='white' , # line markers between states
             colorbar_title='<br>'.join(wrap(''.join(['{}'.format(add_cases(val))]), width=10))
         ))
@@ -177,7 +92,7 @@ def build_us_map(map_date,val='Active', pop = 1):
 
         fig.update_layout(
                 margin=dict(l=10, r=10, t=50, b=50),
-                title_text=add_cases('{} Predicted US {}'.format(map_date.strftime('%b %d,%Y'), val)),
+                title_text=title,
                 geo = dict(
                     scope='usa',
                     projection=go.layout.geo.Projection(type = 'albers usa'),
@@ -191,13 +106,93 @@ def build_us_map(map_date,val='Active', pop = 1):
                     'activecolor': 'gray'
                 }
             )
+    else:
+        fig = go.Figure(data=go.Choropleth(
+            locations=locations.astype(str),
+            z= z_val,
+            locationmode="country names",
+            autocolorscale=False,
+            colorscale='inferno_r',
+            text=text, # hover text
+            marker_line_color='black', # line markers between states
+            colorbar_title='<br>'.join(wrap(''.join(['{}'.format(add_cases(val))]), width=10))
+        ))
+
+        fig.update_layout(
+                margin=dict(l=10, r=10, t=50, b=50),
+                title_text=title,
+                geo = dict(
+                    scope= scope.lower() if scope is not None else None,
+                    projection=go.layout.geo.Projection(type = 'natural earth'),
+                    showlakes=True, # lakes
+                    lakecolor='rgb(255, 255, 255)',
+                    countrycolor='lightgray',
+                    landcolor='whitesmoke',
+                    showland=True,
+                    showframe = False,
+                    showcoastlines = True,
+                    showcountries=True,
+                    visible = False,
+                ),
+                modebar={
+                    'orientation': 'v',
+                    'bgcolor': 'rgba(0,0,0,0)',
+                    'color': 'lightgray',
+                    'activecolor': 'gray'
+                }
+            )
+    if zmax is not None:
+        # one color scale for every frame of an animation
+        fig.update_traces(zmin=0, zmax=zmax)
+    return fig
 
-        graph = dcc.Graph(
-            id='us-projection-map',
-            figure=fig
-        )
-        return graph
-    return
+def build_us_map_animation(map_date, val='Active', pop=1):
+    return build_map_animation('US', 'us-projection-map', map_date, val, pop)
+
+def build_continent_map_animation(map_date, val='Active', continent='World', pop=1):
+    return build_map_animation(continent, 'continent-projection-map', map_date, val, pop)
+
+def build_map_animation(scope, graph_id, map_date, val, pop):
+    if map_date is None or val not in get_cols():
+        return None
+    fig = get_cached_map_animation(scope, val, pop, get_today().normalize(), get_projection_store()['version'])
+    if fig is None:
+        return None
+    return dcc.Graph(
+        id=graph_id,
+        figure=select_frame(fig, get_map_date(map_date).strftime('%Y-%m-%d')),
+    )
+
+# All projected days of one map as a single animated figure, rebuilt each day
+@lru_cache(maxsize=64)
+def get_cached_map_animation(scope, val, pop, today, version):
+    store = get_projection_store()
+    days = sorted(day for s, day in store['maps'] if s == scope and day >= get_today())
+    if not days:
+        return None
+    df_map = store['df'].iloc[np.concatenate([store['maps'][(scope, day)] for day in days])]
+    z_col, text_col = get_map_cols(val, pop)
+    location_col = get_map_location_col(scope)
+    # locations x days, so every frame lists its values in the trace's location order
+    by_day = df_map.assign(Location=df_map[location_col].astype(str)).set_index(['Location', 'Day'])
+    z_val = by_day[z_col].astype(float).unstack('Day')
+    text = by_day[text_col].unstack('Day').fillna('')
+    locations = z_val.index.to_series()
+    fig = build_map_figure(scope, locations, z_val[days[0]], text[days[0]], val, get_map_title(scope, days[0], val), np.nanmax(z_val.values))
+    frames = [
+        (day.strftime('%Y-%m-%d'), day.strftime('%b %d'), z_val[day].values, text[day].values, get_map_title(scope, day, val))
+        for day in days
+    ]
+    return add_date_frames(fig, frames)
+
+def warm_map_cache(days=14):
+    today = get_today().normalize()
+    for d in range(1, days+1):
+        map_date = today + pd.Timedelta(days=d)
+        for scope in get_map_scopes():
+            for val in get_cols():
+                for pop in [1, 2]:
+                    get_map_figure(scope, map_date, val, pop)
 
 def find_smallest_scope(state, country, continent):
     location = state
@@ -208,17 +203,20 @@ def find_smallest_scope(state, country, continent):
             location = country
     return location
 
+def get_location_key(state, country, continent):
+    if continent == 'US':
+        return find_location('US', state)
+    if country == 'None':
+        return world_location if continent == 'World' else (continent, 'None', 'None')
+    location_key = find_location(country, state)
+    if location_key is not None and continent not in ['US', 'World'] and location_key[0] != continent:
+        return None
+    return location_key
+
 def build_state_projection(state, country, continent, vals):
     location = find_smallest_scope(state, country, continent)
-    df_projections = get_df_projections()
-    df_projections_sub = df_projections.loc[ (df_projections.Province == state) & (df_projections.Country == country)]
-    if continent not in ['US', 'World']:
-        df_projections_sub = df_projections_sub.loc[(df_projections_sub.Continent == continent)]
-    if continent == 'US':
-        df_projections_sub = df_projections.loc[(df_projections.Country == 'US') & (df_projections.Province == state)]
-    if continent == 'World':
-        if country =='None':
-            df_projections_sub = df_projections.loc[(df_projections.Continent == 'None')] #include only global world data
+    location_key = get_location_key(state, country, continent)
+    df_projections_sub = get_location_projections(location_key)
     fig = go.Figure()
 
     cols = get_cols()
@@ -273,27 +271,78 @@ def build_state_projection(state, country, continent, vals):
     )
     return graph
 
+# One line per vintage of the projections, oldest faintest, so revisions of
+# the forecast show as the lines fanning out
+def build_forecast_revisions(state, country, continent, val):
+    if val not in get_cols():
+        return None
+    location = find_smallest_scope(state, country, continent)
+    df = get_vintage_forecasts(get_location_key(state, country, continent), val)
+    fig = go.Figure()
+    vintages = df['Vintage'].unique()
+    color = get_colors()[get_cols()[val]]
+    for i, (vintage, df_vintage) in enumerate(df.groupby('Vintage')):
+        latest = i == len(vintages) - 1
+        fig.add_trace(go.Scatter(
+            name=pd.Timestamp(vintage).strftime('%b %d'),
+            x=df_vintage['Day'],
+            y=df_vintage[val].values,
+            mode="lines",
+            line=dict(color=color, width=3 if latest else 1),
+            opacity=1 if latest else 0.15 + 0.6*i/len(vintages),
+            hovertemplate='%{x|%b %d}: %{y:,}<extra>Made on ' + pd.Timestamp(vintage).strftime('%b %d') + '</extra>',
+        ))
+
+    title = '<br>'.join(wrap('<b> Forecasts of {} for {} </b>'.format(add_cases(val), location), width=40))
+    fig.update_layout(
+                height=550,
+                title={
+                    'text': title,
+                    'y':0.95,
+                    'x':0.5,
+                    'xanchor': 'center',
+                    'yanchor': 'top'},
+                title_font_size=25,
+                xaxis={'title': "Date",'linecolor': 'lightgrey'},
+                yaxis={'title': "Count",'linecolor': 'lightgrey'},
+                showlegend=False,
+                margin={'l': 40, 'b': 40, 't': 40, 'r': 10},
+                hovermode='closest',
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                modebar={
+                    'orientation': 'v',
+                    'bgcolor': 'rgba(0,0,0,0)',
+                    'color': 'lightgray',
+                    'activecolor': 'gray'
+                }
+            )
+
+    graph = dcc.Graph(
+        id='forecast-revisions-graph',
+        figure=fig
+    )
+    return graph
+
 def get_stat(d, val, scope):
     if d is None:
         return None
-    if isinstance(d, str):
-        d = datetime.datetime.strptime(d, '%Y-%m-%d').date()
-    df_projections = get_df_projections()
+    d = get_map_date(d)
     if scope == 'US':
-        df_projections_sub = df_projections.loc[(df_projections.Country == scope) & (df_projections.Province == 'None')]
+        location = find_location('US')
     elif scope =='World':
-        df_projections_sub = df_projections.loc[df_projections.Continent == 'None']
+        location = world_location
     else:
-        df_projections_sub = df_projections.loc[(df_projections.Continent == scope) & (df_projections.Country == 'None')]
+        location = (scope, 'None', 'None')
 
-    df_projections_sub = df_projections_sub.loc[df_projections_sub['Day']==d].reset_index()
+    projection = get_location_projection_on(location, d)
 
-    if df_projections_sub.empty:
+    if projection is None:
         return None
 
     card_content = [
         dbc.CardHeader(
-            f'{df_projections_sub.iloc[0][val]:,}',
+            f'{projection[val]:,}',
             style={"textAlign":"center","fontSize":30,"fontWeight": "bold","color":'#1E74F0'}
         ),
         dbc.CardBody(
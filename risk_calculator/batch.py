@@ -0,0 +1,197 @@
+import io
+import re
+import json
+import math
+import itertools
+
+import flask
+import numpy as np
+import pandas as pd
+
+from risk_calculator.utils import get_title_mapping, oxygen, convert_temp_units
+from risk_calculator.utils import get_age_error, get_range_error, get_missing_error
+from risk_calculator.models import get_model
+
+# Scores whole lists of patients with the pickled calculator bundles. A batch is
+# a CSV, JSON array or newline-delimited JSON of records whose keys are the
+# model's own column names (e.g. "Age", "Gender", "Diabetes"); it is read and
+# scored chunk by chunk (JSON arrays are decoded record by record) so the full
+# table never has to be held in memory.
+chunk_size = 500
+json_block_size = 1 << 16
+whitespace = re.compile(r'\s*')
+
+def get_batch_column(df, name, default):
+    if name not in df:
+        return np.full(len(df), default, dtype=float)
+    return pd.to_numeric(df[name], errors='coerce').fillna(default).values.astype(float)
+
+# Same rules as valid_input, applied to every row at once: the first failing
+# feature gives the row its error, rows without one are scored
+def get_batch_errors(features, df, language=0):
+    title_mapping = get_title_mapping()
+    errors = np.full(len(df), '', dtype=object)
+    missing = np.zeros(len(df), dtype=int)
+    numerics = features["numeric"]
+    for content in numerics:
+        name = content["name"]
+        raw = df[name] if name in df else pd.Series(np.nan, index=df.index)
+        absent = raw.isna().values
+        val = pd.to_numeric(raw, errors='coerce').values.astype(float)
+        pending = errors == ''
+        if name == "Age":
+            errors[pending & absent] = get_age_error(language)
+        else:
+            missing += absent
+        in_range = (val >= content["min_val"]) & (val <= content["max_val"])
+        if title_mapping[0][name] == oxygen:
+            in_range |= (val == 1) | (val == 0)
+        errors[pending & ~absent & ~in_range] = get_range_error(name, content["min_val"], content["max_val"], language)
+    # the dropdowns of the calculators only offer the allowed values
+    for content in features["categorical"]:
+        if content["name"] in df:
+            val = get_batch_column(df, content["name"], content["default"])
+            invalid = (errors == '') & ~np.isin(val, content["vals"])
+            errors[invalid] = get_range_error(content["name"], min(content["vals"]), max(content["vals"]), language)
+    threshold = math.floor(2*len(numerics)/3)
+    errors[(errors == '') & (missing > threshold)] = get_missing_error(threshold, language)
+    return errors
+
+def build_feature_matrix(m, features, n_features, df, temp_unit):
+    x = np.zeros((len(df), n_features))
+    for feat in features["categorical"]:
+        x[:, feat["index"]] = get_batch_column(df, feat["name"], feat["default"])
+    for feat in features["numeric"]:
+        vals = get_batch_column(df, feat["name"], np.nan)
+        if feat["name"] == "Body Temperature" and temp_unit == "°C":
+            vals = convert_temp_units(vals)
+        x[:, feat["index"]] = vals
+    if m:
+        multidrop = features["multidrop"][0]
+        for ind, name in zip(multidrop["index"], multidrop["vals"]):
+            x[:, ind] = get_batch_column(df, name, 0) != 0
+    return x
+
+def score_batch(m, bundle, df, temp_unit="°F", explain=False, language=0):
+    features = bundle["json"]
+    columns = list(bundle["columns"])
+    errors = get_batch_errors(features, df, language)
+    valid = errors == ''
+    result = pd.DataFrame({'Row': df.index, 'Valid': valid, 'Error': errors})
+    result['Risk Score'] = pd.Series(pd.NA, index=result.index, dtype='Int64')
+    result['Imputed'] = ''
+    if explain:
+        for c in columns:
+            result['SHAP ' + c] = np.nan
+    if not valid.any():
+        return result
+    x = build_feature_matrix(m, features, len(columns), df[valid], temp_unit)
+    x_full = bundle["imputer"].transform(x)
+    X = pd.DataFrame(x_full, columns=columns)
+    score = bundle["model"].predict_proba(X)[:, 1]
+    # rounded the same way as predict_risk so both paths report the same score
+    result.loc[valid, 'Risk Score'] = [int(100*round(s, 2)) for s in score]
+    imputed = np.isnan(x)
+    result.loc[valid, 'Imputed'] = [';'.join(c for c, i in zip(columns, row) if i) for row in imputed]
+    if explain:
+        shap_values = bundle["explainer"].shap_values(X)
+        result.loc[valid, ['SHAP ' + c for c in columns]] = np.around(shap_values, decimals=4)
+    return result
+
+# Records of a JSON array, decoded one at a time as the text stream is read
+def iter_json_records(source, block_size=json_block_size):
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    expect = '['
+    while True:
+        pos = whitespace.match(buffer, pos).end()
+        if pos == len(buffer):
+            if eof:
+                raise ValueError('unexpected end of the JSON array')
+            buffer, pos = source.read(block_size), 0
+            eof = buffer == ''
+            continue
+        c = buffer[pos]
+        if expect == '[':
+            if c != '[':
+                raise ValueError('a JSON batch must be an array of records')
+            pos, expect = pos + 1, 'first'
+            continue
+        if c == ']' and expect in ('first', ','):
+            return
+        if expect == ',':
+            if c != ',':
+                raise ValueError("expected ',' or ']' between records")
+            pos, expect = pos + 1, 'record'
+            continue
+        # a record is only taken once text follows it, so one cut at the end of
+        # the buffer is read further rather than decoded short
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+            if end == len(buffer) and not eof:
+                raise ValueError
+        except ValueError:
+            if eof:
+                raise
+            more = source.read(block_size)
+            buffer, pos, eof = buffer[pos:] + more, 0, more == ''
+            continue
+        yield record
+        pos, expect = end, ','
+
+def iter_record_chunks(records, chunk_size):
+    start = 0
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            return
+        yield pd.DataFrame(chunk, index=range(start, start + len(chunk)))
+        start += len(chunk)
+
+def read_batch(source, content_type='text/csv', chunk_size=chunk_size):
+    if content_type == 'application/x-ndjson':
+        return pd.read_json(source, lines=True, chunksize=chunk_size)
+    if content_type == 'application/json':
+        return iter_record_chunks(iter_json_records(source), chunk_size)
+    return pd.read_csv(source, chunksize=chunk_size)
+
+# Python entry point: yields one result frame per chunk of the batch
+def iter_score_batch(m, bundle, source, content_type='text/csv', temp_unit="°F", explain=False, language=0):
+    for df in read_batch(source, content_type):
+        yield score_batch(m, bundle, df, temp_unit, explain, language)
+
+def stream_csv(results):
+    header = True
+    for result in results:
+        yield result.to_csv(index=False, header=header)
+        header = False
+
+def stream_ndjson(results):
+    for result in results:
+        yield result.to_json(orient='records', lines=True).rstrip('\n') + '\n'
+
+# POST body is the batch; query arguments: labs=0|1, temperature_unit=F|C,
+# shap=0|1 and language=0|1|2 (for the error messages)
+def get_batch_response(labs, no_labs):
+    args = flask.request.args
+    bundle = get_model(no_labs if args.get('labs', '1') == '0' else labs)
+    m = bundle["m"]
+    temp_unit = "°C" if args.get('temperature_unit', 'F').lstrip('°').upper() == 'C' else "°F"
+    explain = args.get('shap', '0') == '1'
+    language = args.get('language', '0')
+    if language not in ('0', '1', '2'):
+        flask.abort(400, 'language must be 0, 1 or 2')
+    content_type = flask.request.mimetype
+    # malformed input is reported before the response starts streaming
+    try:
+        chunks = iter(read_batch(io.TextIOWrapper(flask.request.stream, encoding='utf-8'), content_type))
+        first = next(chunks, None)
+    except ValueError as e:
+        flask.abort(400, str(e))
+    if first is None:
+        flask.abort(400, 'empty batch')
+    chunks = itertools.chain([first], chunks)
+    results = (score_batch(m, bundle, df, temp_unit, explain, int(language)) for df in chunks)
+    if content_type in ('application/json', 'application/x-ndjson'):
+        return flask.Response(flask.stream_with_context(stream_ndjson(results)), mimetype='application/x-ndjson')
+    return flask.Response(flask.stream_with_context(stream_csv(results)), mimetype='text/csv')
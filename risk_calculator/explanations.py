@@ -0,0 +1,183 @@
+import os
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from functools import partial
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# 'plotly' sends the explanation as a small bar chart figure; 'matplotlib'
+# falls back to the SHAP force plot PNG rendered in the background
+renderer = os.environ.get('RISK_EXPLANATION_RENDERER', 'plotly')
+
+# SHAP force plots are rasterized by a small pool of worker processes (matplotlib
+# keeps global state, so threads are not an option). The PNG is written to a
+# directory shared by all gunicorn workers and served by a Flask route, so
+# whichever worker answers the polling callback can deliver it.
+explanations_dir = os.path.join(tempfile.gettempdir(), 'covidanalytics_explanations')
+max_pool_workers = 2
+max_wait_seconds = 30
+max_stored_plots = 500
+# renders queued or running in this worker; past that, no plot is offered
+max_pending_jobs = 8
+# old plots are removed once every this many submitted renders
+cleanup_interval = 50
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+_pending = set()
+_submits = 0
+logger = logging.getLogger(__name__)
+
+def get_executor():
+    global _executor, _executor_pid
+    with _lock:
+        # the pool must be created after gunicorn forks, never inherited from the master
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=max_pool_workers)
+            _executor_pid = os.getpid()
+        return _executor
+
+def get_plot_path(key):
+    return os.path.join(explanations_dir, key + '.png')
+
+def render_force_plot(path, submitted, expected_value, shap_values, features, names):
+    # the page has stopped polling for it
+    if time.time() - submitted > max_wait_seconds:
+        return
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import shap
+
+    plot = shap.force_plot(
+        expected_value,
+        shap_values,
+        features,
+        link = "logit",
+        matplotlib = True,
+        show = False,
+        feature_names=names
+    )
+    plt.axis('off') # this rows the rectangular frame
+    img = BytesIO()
+    plot.savefig(img, format='PNG')
+    plt.close(plot)
+    # every process writes its own temporary file, as identical plots may be rendered at once
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(img.getvalue())
+    os.replace(tmp_path, path)
+
+def remove_old_plots():
+    plots = sorted(
+        (os.path.join(explanations_dir, f) for f in os.listdir(explanations_dir) if f.endswith('.png')),
+        key=os.path.getmtime
+    )
+    for path in plots[:-max_stored_plots]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+# A failed render leaves no file, so without this the client only sees the timeout
+def log_render_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error('Force plot render failed', exc_info=future.exception())
+
+def release_job(key, future):
+    with _lock:
+        _pending.discard(key)
+
+# Queues the render of a plot unless the same one is already queued; returns
+# False when too many renders are waiting
+def queue_render(key, *args):
+    global _submits
+    with _lock:
+        if key in _pending:
+            return True
+        if len(_pending) >= max_pending_jobs:
+            return False
+        _pending.add(key)
+        _submits += 1
+        cleanup = _submits % cleanup_interval == 1
+    if cleanup:
+        remove_old_plots()
+    try:
+        future = get_executor().submit(render_force_plot, get_plot_path(key), *args)
+    except Exception:
+        release_job(key, None)
+        raise
+    future.add_done_callback(log_render_error)
+    future.add_done_callback(partial(release_job, key))
+    return True
+
+def submit_force_plot(expected_value, shap_values, features, names):
+    expected_value = np.around(expected_value, decimals=2)
+    shap_values = np.around(shap_values, decimals=2)
+    features = np.around(features, decimals=2)
+    # identical inputs produce the same plot, so they share one file
+    key = hashlib.sha1(repr((expected_value, shap_values.tolist(), features.values.tolist(), names)).encode()).hexdigest()
+    os.makedirs(explanations_dir, exist_ok=True)
+    submitted = time.time()
+    if not os.path.exists(get_plot_path(key)):
+        if not queue_render(key, submitted, expected_value, shap_values, features, names):
+            # the page shows no plot rather than waiting for the timeout
+            return None
+    return {'key': key, 'submitted': submitted}
+
+# Returns the image source once the plot is ready, '' while it is pending and
+# None when the job has been given up on
+def get_force_plot_src(job):
+    if os.path.exists(get_plot_path(job['key'])):
+        return '/risk_calculator/explanation/{}.png'.format(job['key'])
+    if time.time() - job['submitted'] > max_wait_seconds:
+        return None
+    return ''
+
+def poll_force_plot(job):
+    if not job:
+        return '', {}, True
+    src = get_force_plot_src(job)
+    if src:
+        return src, {"height":200}, True
+    return '', {}, src is None
+
+def logistic(x):
+    return 1/(1+np.exp(-x))
+
+# Force-style horizontal bar chart of the SHAP contributions (log-odds), built
+# as a plain figure dict so the callback only ships the bars themselves
+def build_shap_figure(expected_value, shap_values, features, names, min_contribution=0.01):
+    expected_value = float(np.ravel(expected_value)[0])
+    shap_values = np.ravel(shap_values).astype(float)
+    features = np.ravel(features)
+    shown = np.flatnonzero(np.abs(shap_values) >= min_contribution)
+    shown = shown[np.argsort(np.abs(shap_values[shown]))]
+    labels = ['{} = {}'.format(names[i], round(float(features[i]), 2)) for i in shown]
+    base = logistic(expected_value)
+    risk = logistic(expected_value + shap_values.sum())
+    return {
+        'data': [{
+            'type': 'bar',
+            'orientation': 'h',
+            'x': np.around(shap_values[shown], decimals=2).tolist(),
+            'y': labels,
+            'marker': {'color': ['#ff0051' if shap_values[i] > 0 else '#008bfb' for i in shown]},
+            'hovertemplate': '%{y}<br>%{x:+.2f}<extra></extra>',
+        }],
+        'layout': {
+            'title': {'text': '{:.0%} → {:.0%}'.format(base, risk), 'x': 0.5},
+            'height': 120 + 22*len(shown),
+            'margin': {'l': 10, 'r': 10, 't': 40, 'b': 30},
+            'xaxis': {'zeroline': True, 'zerolinecolor': 'lightgrey'},
+            'yaxis': {'automargin': True},
+            'paper_bgcolor': 'rgba(0,0,0,0)',
+            'plot_bgcolor': 'rgba(0,0,0,0)',
+        },
+    }
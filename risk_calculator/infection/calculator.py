@@ -81,10 +81,10 @@ def get_languages(labs_auc,labs_population,labs_positive,no_labs_auc,no_labs_pop
     }
 
 
-def predict_risk_infec(cols,model,features,imputer,explainer,feature_vals,temp_unit,card_text,language):
-    score,impute_text,plot = predict_risk(False,model,features,imputer,explainer,feature_vals,cols,temp_unit,language)
+def predict_risk_infec(prepared,feature_vals,temp_unit,card_text,language):
+    score,impute_text,figure,plot_job = predict_risk(prepared,feature_vals,temp_unit,language)
     card_content = [
         html.H4(card_text[0],className="score-calculator-card-content-infection"),
         html.H4(str(int(math.floor(score/10.0)))+card_text[1],className="score-calculator-card-content-infection"),
     ]
-    return card_content,impute_text,plot
+    return card_content,impute_text,figure,plot_job
@@ -0,0 +1,62 @@
+import pickle
+import threading
+
+from risk_calculator.utils import prepare_model
+
+# The four calculator bundles. Unpickling one imports xgboost, sklearn and shap
+# and rebuilds a TreeExplainer, so each bundle is loaded by the first request
+# that needs it rather than by every worker at boot. What the pages are laid
+# out with (feature spec, columns, AUC, cohort sizes) is read from the bundle
+# with the model objects left out, so registering the callbacks loads no model.
+model_paths = {
+    'mortality_labs': (True, 'assets/risk_calculators/mortality/model_with_lab.pkl'),
+    'mortality_no_labs': (True, 'assets/risk_calculators/mortality/model_without_lab.pkl'),
+    'infection_labs': (False, 'assets/risk_calculators/infection/model_with_lab.pkl'),
+    'infection_no_labs': (False, 'assets/risk_calculators/infection/model_without_lab.pkl'),
+}
+info_keys = ["json", "columns", "AUC", "Size Training", "Size Test", "Percentage Training", "Percentage Test"]
+
+_models = {}
+_infos = {}
+_locks = {name: threading.Lock() for name in model_paths}
+
+def get_model(name):
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _locks[name]:
+        if name not in _models:
+            m, path = model_paths[name]
+            with open(path, 'rb') as f:
+                _models[name] = prepare_model(name, m, pickle.load(f))
+    return _models[name]
+
+class SkippedObject:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __setstate__(self, state):
+        pass
+
+# Unpickles the plain data of a bundle; the model, imputer and explainer
+# classes are never imported and come back as empty SkippedObjects
+class InfoUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if module.split('.')[0] in ('builtins', 'copyreg', 'collections', 'numpy', 'pandas'):
+            return super().find_class(module, name)
+        return SkippedObject
+
+def read_model_info(path):
+    with open(path, 'rb') as f:
+        bundle = InfoUnpickler(f).load()
+    info = {key: bundle[key] for key in info_keys}
+    info["columns"] = list(info["columns"])
+    return info
+
+def get_model_info(name):
+    if name in _models:
+        bundle = _models[name]
+        return dict({key: bundle[key] for key in info_keys}, columns=list(bundle["columns"]))
+    if name not in _infos:
+        _infos[name] = read_model_info(model_paths[name][1])
+    return _infos[name]
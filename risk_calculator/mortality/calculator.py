@@ -81,10 +81,10 @@ def get_languages(labs_auc,labs_population,labs_positive,no_labs_auc,no_labs_pop
 
 
 
-def predict_risk_mort(cols,model,features,imputer,explainer,feature_vals,temp_unit,card_text,language):
-    score,imputed_text,plot = predict_risk(True,model,features,imputer,explainer,feature_vals,cols,temp_unit,language)
+def predict_risk_mort(prepared,feature_vals,temp_unit,card_text,language):
+    score,imputed_text,figure,plot_job = predict_risk(prepared,feature_vals,temp_unit,language)
     card_content = [
         html.H4(card_text,className="score-calculator-card-content"),
         html.H4(str(score)+"%",className="score-calculator-card-content"),
     ]
-    return card_content,imputed_text,plot
+    return card_content,imputed_text,figure,plot_job
@@ -1,25 +1,54 @@
 import numpy as np
 import pandas as pd
 import math
-import shap
-import pickle
-import matplotlib
-import matplotlib.pyplot as plt
+from functools import lru_cache
 from textwrap import wrap
 
 import risk_calculator.english as english
 import risk_calculator.spanish as spanish
 import risk_calculator.italian as italian
+from risk_calculator.explanations import submit_force_plot, build_shap_figure
+import risk_calculator.explanations as explanations
 
-matplotlib.use('Agg')
 oxygen = 'Oxygen Saturation'
 
+# prepared models by name, the key of the prediction cache
+prepared_models = {}
+risk_cache_size = 2048
+
+# Feature names and message templates in every language, compiled once
+title_mapping = {
+    0: english.get_feature_names(),
+    1: spanish.get_feature_names(),
+    2: italian.get_feature_names()
+}
+
+age_error = [
+    "Please insert a value for Age.",
+    "Por favor inserte un valor para Edad.",
+    "Inserisci un valore per Età."
+]
+
+range_error = [
+    "Please insert a numeric value for {} between {} and {}",
+    "Por favor inserte un valor numérico para {} entre {} y {}",
+    "Inserisci un valore numerico per {} fra {} e {}"
+]
+
+missing_error = [
+    "Please insert at least {} numeric values.",
+    "Por favor inserte al menos {} valores numericos.",
+    "Si prega di inserire almeno {} valori numerici."
+]
+
+missing_text = [
+    ['The missing feature, ',', was calculated as '],
+    ['La característica que falta, ', ' fue calculado como '],
+    ['La caratteristica mancante, ', ' è stato calcolato come '],
+]
+
 def get_title_mapping():
-    return {
-        0: english.get_feature_names(),
-        1: spanish.get_feature_names(),
-        2: italian.get_feature_names()
-    }
+    return title_mapping
 
 
 def convert_temp_units(x):
@@ -41,14 +70,21 @@ def oxygen_vals(val,language):
 
 def get_oxygen_info(cols,feats):
     oxygen_in = "SaO2" in cols or 'ABG: Oxygen Saturation (SaO2)' in cols
-    title_mapping = get_title_mapping()
     for i,f in enumerate(feats):
         if title_mapping[0][f["name"]] == oxygen:
             return oxygen_in, i
     return oxygen_in, None
 
+def get_age_error(language):
+    return age_error[language]
+
+def get_range_error(name,min_val,max_val,language):
+    return range_error[language].format(title_mapping[language][name],min_val,max_val)
+
+def get_missing_error(threshold,language):
+    return missing_error[language].format(threshold)
+
 def valid_input(features,feature_vals,length,language):
-    title_mapping = get_title_mapping()
     #assume theres only one categorical
     numerics = feature_vals[1:length+1]
     missing = 0
@@ -56,12 +92,7 @@ def valid_input(features,feature_vals,length,language):
         val = numerics[feat]
         if val is None:
             if features[feat]["name"] == "Age":
-                text = [
-                "Please insert a value for Age.",
-                "Por favor inserte un valor para Edad.",
-                "Inserisci un valore per Età."
-                ]
-                return False, text[language], feature_vals
+                return False, get_age_error(language), feature_vals
             feature_vals[feat+1] = np.nan
             missing += 1
         else:
@@ -72,78 +103,117 @@ def valid_input(features,feature_vals,length,language):
             if title_mapping[0][name] == oxygen and (val == 1 or val == 0):
                 continue
             if val < min_val or val > max_val:
-                text = [
-                "Please insert a numeric value for {} between {} and {}".format(title_mapping[language][name],min_val,max_val),
-                "Por favor inserte un valor numérico para {} entre {} y {}".format(title_mapping[language][name],min_val,max_val),
-                "Inserisci un valore numerico per {} fra {} e {}".format(title_mapping[language][name],min_val,max_val)
-                ]
-                return False,text[language],feature_vals
+                return False,get_range_error(name,min_val,max_val,language),feature_vals
     threshold = math.floor(2*length/3)
     if missing > threshold:
-        text = [
-        "Please insert at least {} numeric values.".format(threshold),
-        "Por favor inserte al menos {} valores numericos.".format(threshold),
-        "Si prega di inserire almeno {} valori numerici.".format(threshold)
-        ]
-        return False,text[language],feature_vals
+        return False,get_missing_error(threshold,language),feature_vals
     return True,"",feature_vals
 
-def predict_risk(m,model,features,imputer,explainer,feature_vals,columns,temp_unit,language):
-    x = [0]*len(model.feature_importances_)
-    #if temperature is in F, switch measurement to Celsius
-    convert_temperature = temp_unit[0] == "°C"
-    #align order of feature vector so that values are in correct order
-    i = 0
-    for feat in features["categorical"]:
-        x[feat["index"]] = feature_vals[i]
-        i+=1
-    for f,feat in enumerate(features["numeric"]):
-        if feat["name"] == "Body Temperature" and convert_temperature:
-            x[feat["index"]] = convert_temp_units(feature_vals[i])
-        else:
-            x[feat["index"]] = feature_vals[i]
-        i+=1
-    if m:
-        comorbidities = feature_vals[i]
-        indexes = features["multidrop"][0]["index"]
-        for c in comorbidities:
-            ind = features["multidrop"][0]["vals"].index(c)
-            x[indexes[ind]] = 1
-    imputed = np.argwhere(np.isnan(x))
-    x_full = imputer.transform([x])
-    X = pd.DataFrame(columns = columns, index = range(1), dtype=np.float)
-    X.loc[0]=x_full[0]
-    score = model.predict_proba(X)[:,1]
-    score = int(100*round(score[0], 2))
-    impute_text = [''] * len(imputed)
-    missing_text = [
-        ['The missing feature, ',', was calculated as '],
-        ['La característica que falta, ', ' fue calculado como '],
-        ['La caratteristica mancante, ', ' è stato calcolato come '],
-        ]
-    title_mapping = get_title_mapping()
-    for i,ind in enumerate(imputed):
-        ind = int(ind)
-        text = missing_text[language][0] + title_mapping[language][columns[ind]] + missing_text[language][1]
-        text += str(round(x_full[0][ind],2))
+# Everything predict_risk needs from a pickled bundle, worked out once per model:
+# where each calculator input lands in the feature vector, the column Index and
+# a template row that every request copies instead of building a list
+def prepare_model(name, m, bundle):
+    features = bundle["json"]
+    prepared = dict(bundle)
+    prepared["name"] = name
+    prepared["m"] = m
+    prepared["columns"] = pd.Index(bundle["columns"])
+    # the calculators send the categorical values first, then the numeric ones
+    inputs = features["categorical"] + features["numeric"]
+    prepared["input_index"] = np.array([feat["index"] for feat in inputs])
+    prepared["temperature_input"] = next((i for i,feat in enumerate(inputs) if feat["name"] == "Body Temperature"), None)
+    prepared["comorbidity_index"] = dict(zip(features["multidrop"][0]["vals"], features["multidrop"][0]["index"])) if m else {}
+    prepared["template"] = np.zeros((1, len(prepared["columns"])))
+    # per language: SHAP labels, force plot labels and imputation sentence openings
+    prepared["labels"] = {}
+    prepared["wrapped_labels"] = {}
+    prepared["impute_text"] = {}
+    for language, names in title_mapping.items():
+        labels = [names[c] for c in prepared["columns"]]
+        prepared["labels"][language] = labels
+        prepared["wrapped_labels"][language] = ['\n'.join(wrap(label, width=12)) for label in labels]
+        prepared["impute_text"][language] = [missing_text[language][0] + label + missing_text[language][1] for label in labels]
+    prepared_models[name] = prepared
+    return prepared
+
+def get_feature_vector(prepared,feature_vals,temp_unit):
+    x = prepared["template"].copy()
+    n = len(prepared["input_index"])
+    vals = np.array(feature_vals[:n], dtype=float)
+    #if temperature is in Celsius, switch measurement to Fahrenheit
+    t = prepared["temperature_input"]
+    if t is not None and temp_unit[0] == "°C":
+        vals[t] = convert_temp_units(vals[t])
+    x[0, prepared["input_index"]] = vals
+    if prepared["m"]:
+        for c in feature_vals[n]:
+            x[0, prepared["comorbidity_index"][c]] = 1
+    return x
+
+def score_feature_vector(prepared,x):
+    x_full = prepared["imputer"].transform(x)
+    # xgboost checks the feature names, so the row still goes in as a frame
+    X = pd.DataFrame(x_full, columns=prepared["columns"], copy=False)
+    score = prepared["model"].predict_proba(X)[:,1]
+    return int(100*round(score[0], 2)), x_full, X
+
+# Language-independent part of a prediction. Repeated submits and language
+# switches send the same inputs, so results are kept per model and canonical
+# feature vector: temperatures already in °F, missing values as None
+@lru_cache(maxsize=risk_cache_size)
+def get_cached_risk(name,x_key):
+    prepared = prepared_models[name]
+    x = np.array([x_key], dtype=float)
+    score, x_full, X = score_feature_vector(prepared,x)
+    explainer = prepared["explainer"]
+    result = {
+        'score': score,
+        'imputed': np.flatnonzero(np.isnan(x[0])),
+        'x_full': x_full[0],
+        'shap': np.ravel(explainer.shap_values(X)),
+        'expected_value': explainer.expected_value,
+    }
+    # shared by every request that hits the cache
+    for key in ['imputed', 'x_full', 'shap']:
+        result[key].setflags(write=False)
+    return result
+
+def get_risk(prepared,feature_vals,temp_unit):
+    x = get_feature_vector(prepared,feature_vals,temp_unit)
+    x_key = tuple(None if v != v else v for v in x[0].tolist())
+    return get_cached_risk(prepared["name"],x_key)
+
+def get_risk_cache_stats():
+    info = get_cached_risk.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hit_rate': info.hits/lookups if lookups else 0.0,
+    }
+
+def predict_risk(prepared,feature_vals,temp_unit,language):
+    columns = prepared["columns"]
+    result = get_risk(prepared,feature_vals,temp_unit)
+    score = result['score']
+    x_full = result['x_full']
+    impute_text = [''] * len(result['imputed'])
+    for i,ind in enumerate(result['imputed']):
+        text = prepared["impute_text"][language][ind] + str(round(x_full[ind],2))
         if columns[ind] == 'Body Temperature':
             impute_text[i] = text + '°F.'
         else:
             impute_text[i] = text + '.'
     impute_text = '  \n'.join(impute_text)
-    shap_new = explainer.shap_values(X)
-    names = ['\n'.join(wrap(''.join(['{}'.format(title_mapping[language][c])]), width=12)) for c in columns]
-    plot = shap.force_plot(
-        np.around(explainer.expected_value, decimals=2),
-        np.around(shap_new, decimals=2),
-        np.around(X, decimals=2) ,
-        link = "logit",
-        matplotlib = True,
-        show = False,
-        feature_names=names
-    )
-    plt.axis('off') # this rows the rectangular frame
-    return score,impute_text,plot
+    if explanations.renderer == 'matplotlib':
+        # the force plot is rendered in the background and polled for by the page
+        X = pd.DataFrame([x_full], columns=columns)
+        plot_job = submit_force_plot(result['expected_value'], result['shap'][None], X, prepared["wrapped_labels"][language])
+        return score,impute_text,None,plot_job
+    figure = build_shap_figure(result['expected_value'], result['shap'], x_full, prepared["labels"][language])
+    return score,impute_text,figure,None
 
 def build_lab_ques_card(lang):
     q = ["Do you have lab values?","¿Tienes valores de laboratorio?","Hai valori di laboratorio?"]
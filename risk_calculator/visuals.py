@@ -166,10 +166,17 @@ def get_personal_visual(id):
                             dbc.Card(
                                 [
                                     dcc.Markdown(id=id+"-explanation"),
+                                    html.Div(id=id+"-graph"),
                                     html.Img(
                                         id = id,
                                         style={"height":200}
                                     ),
+                                    dcc.Store(id=id+"-job"),
+                                    dcc.Interval(
+                                        id=id+"-interval",
+                                        interval=500,
+                                        disabled=True
+                                    ),
                                 ],
                                 style={
                                     "borderColor": "white",
@@ -1,6 +1,7 @@
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
+from map_animation import get_animation_toggle
 from ventilators.utils import get_first_date, get_no_model_visual, get_df_mod1_projections
 
 def get_shortage():
@@ -64,6 +65,7 @@ def get_shortage():
                                     ),
                                     id="date-projections-picker-div"
                                 ),
+                                get_animation_toggle('map-animation-vent'),
                             ],
                             xs=12,
                             sm=4,
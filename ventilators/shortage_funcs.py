@@ -1,22 +1,32 @@
-from ventilators.utils import get_df_mod1_projections, get_df_mod2_projections
-from ventilators.utils import us_map, us_timeline, get_no_model_visual
+import dash_core_components as dcc
+
+from data_cache import load_cached
+from map_animation import select_frame
+from ventilators.utils import get_model_key, get_baseline, get_chosen_date, ventilator_path
+from ventilators.utils import us_map, us_map_animation, us_timeline, get_no_model_visual
 
 # Build the map of current demand, supply, and shortage
 def build_shortage_map(chosen_model,chosen_date,val):
-    if chosen_model == "Washington IHME":
-        df_map,_ = get_df_mod1_projections()
-    else:
-        df_map = get_df_mod2_projections()
+    baseline = get_baseline(get_model_key(chosen_model))
     no_model_visual = get_no_model_visual()
-    return us_map(df_map,chosen_date,val,no_model_visual)
+    return us_map(baseline,chosen_date,val,no_model_visual)
+
+# Same map with every date as an animation frame, starting on the chosen date
+def build_shortage_map_animation(chosen_model,chosen_date,val):
+    model = get_model_key(chosen_model)
+    fig = load_cached(
+        'ventilators shortage animation {} {}'.format(model, val),
+        ventilator_path.format('state_supplies_table_baseline', model),
+        lambda: us_map_animation(get_baseline(model),val,get_no_model_visual())
+    )
+    if fig is None:
+        return us_map(get_baseline(model),chosen_date,val,get_no_model_visual())
+    return dcc.Graph(
+        id='projection-map-vent',
+        figure=select_frame(fig, get_chosen_date(chosen_date).strftime('%Y-%m-%d'))
+    )
 
 # Build the US timeline of current demand, supply, and shortage
 def build_shortage_timeline(chosen_model):
-    if chosen_model == "Washington IHME":
-        df_projections_vent_us,_ = get_df_mod1_projections()
-    else:
-        df_projections_vent_us = get_df_mod2_projections()
-
-    df_projections_vent_us = df_projections_vent_us.loc[df_projections_vent_us.State == 'US']
-
+    df_projections_vent_us = get_baseline(get_model_key(chosen_model))['us']
     return us_timeline(df_projections_vent_us, "US Ventilator Supply, Demand, & Shortage", False)
@@ -1,112 +1,112 @@
+import numpy as np
 import pandas as pd
-import datetime
 
-import dash_html_components as html
-
-from ventilators.utils import get_df_mod1_transfers,get_df_mod1_projections
-from ventilators.utils import get_df_mod2_transfers,get_df_mod2_projections
+from ventilators.utils import get_model_key, get_chosen_date, get_params_key
+from ventilators.utils import get_transfers_store, get_optimized_store, get_shortage_effect
 from ventilators.utils import us_map, us_timeline, get_no_model_visual, get_model_visual
 
-def build_transfers_map(chosen_model,chosen_date,p1,p2,p3):
-    if chosen_model == "Washington IHME":
-        df_map = pd.read_csv('data/predicted_ventilator/state_supplies_table-ihme.csv', sep=",", parse_dates = ['Date'])
-    else:
-        df_map = pd.read_csv('data/predicted_ventilator/state_supplies_table-ode.csv', sep=",", parse_dates = ['Date'])
+def get_transfers_on(chosen_model,chosen_date,p1,p2,p3):
+    store = get_transfers_store(get_model_key(chosen_model))
+    partition = store['partitions'].get(get_params_key(p1,p2,p3))
+    if partition is None:
+        return store['df'].iloc[:0]
+    return partition['dates'].get(get_chosen_date(chosen_date), store['df'].iloc[:0])
 
-    df_map.loc[:,'Date'] = pd.to_datetime(df_map['Date'], format='y%m%d').dt.date
-    df_map = df_map.loc[df_map.Param1==float(p1)]
-    df_map = df_map.loc[df_map.Param2==float(p2)]
-    df_map = df_map.loc[df_map.Param3==float(p3)]
+def build_transfers_map(chosen_model,chosen_date,p1,p2,p3):
+    optimized = get_optimized_store(get_model_key(chosen_model))
+    partition = optimized['partitions'][get_params_key(p1,p2,p3)]
     model_visual = get_model_visual()
-    return us_map(df_map,chosen_date,"Shortage",model_visual)
+    return us_map(partition,chosen_date,"Shortage",model_visual)
 
 def build_transfers_timeline(chosen_model,p1,p2,p3):
-    if chosen_model == "Washington IHME":
-        df_opt_pre, _ = get_df_mod1_projections()
-        df_opt_post = pd.read_csv('data/predicted_ventilator/state_supplies_table-ihme.csv', sep=",", parse_dates = ['Date'])
-    else:
-        df_opt_pre = get_df_mod2_projections()
-        df_opt_post = pd.read_csv('data/predicted_ventilator/state_supplies_table-ode.csv', sep=",", parse_dates = ['Date'])
-
-    df_opt_post.loc[:,'Date'] = pd.to_datetime(df_opt_post['Date'], format='y%m%d').dt.date
-    timeline_cols = ["Date","Shortage"]
-    df_opt_pre = df_opt_pre.loc[df_opt_pre.State == 'US']
-    df_opt_pre = df_opt_pre[timeline_cols]
+    effect = get_shortage_effect(get_model_key(chosen_model))
+    optimized = effect['optimized'][effect['params'][get_params_key(p1,p2,p3)]]
+    # same days as an inner merge of the two series
+    known = ~np.isnan(optimized)
 
     no_model_visual = get_no_model_visual()
     model_visual = get_model_visual()
 
-    df_opt_pre.columns = ["Date",no_model_visual["Shortage"]]
-
-    df_opt_post = df_opt_post.loc[
-                                    (df_opt_post.State == 'US') & \
-                                    (df_opt_post.Param1==float(p1)) & \
-                                    (df_opt_post.Param2==float(p2)) & \
-                                    (df_opt_post.Param3==float(p3))
-                                ]
-
-    df_opt_post = df_opt_post[timeline_cols]
-    df_opt_post.columns = ["Date",model_visual["Shortage"]]
-
-    df_opt_effect = pd.merge(df_opt_pre,df_opt_post,on='Date',how='inner')
+    df_opt_effect = pd.DataFrame({
+        "Date": effect['dates'][known],
+        no_model_visual["Shortage"]: effect['baseline'][known],
+        model_visual["Shortage"]: optimized[known],
+    })
 
     return us_timeline(df_opt_effect,"Optimization Effect on Shortage",True)
 
 def build_transfer_options(chosen_model,chosen_date,to_or_from,p1,p2,p3):
-    if chosen_model == "Washington IHME":
-        df_trans, _ = get_df_mod1_transfers()
-    else:
-        df_trans = get_df_mod2_transfers()
-    if isinstance(chosen_date, str):
-        chosen_date = datetime.datetime.strptime(chosen_date, '%Y-%m-%d').date()
-
-    df_trans = df_trans.loc[df_trans['Date']==chosen_date]
-    df_trans = df_trans.loc[df_trans.Param1==float(p1)]
-    df_trans = df_trans.loc[df_trans.Param2==float(p2)]
-    df_trans = df_trans.loc[df_trans.Param3==float(p3)]
+    df_trans = get_transfers_on(chosen_model,chosen_date,p1,p2,p3)
 
     if to_or_from == "to":
         return [{'label': x, 'value': x} for x in sorted(df_trans.State_To.unique())]
     else:
         return [{'label': x, 'value': x} for x in sorted(df_trans.State_From.unique())]
 
-def generate_table(chosen_model,chosen_date,p1,p2,p3,to_or_from=None,state=None):
-    orig_cols = ["State_From","State_To","Num_Units"]
-    final_cols = ["Origin","Destination","Units"]
-
-    if chosen_model == "Washington IHME":
-        df_trans, _ = get_df_mod1_transfers()
-    else:
-        df_trans = get_df_mod2_transfers()
-    if isinstance(chosen_date, str):
-        chosen_date = datetime.datetime.strptime(chosen_date, '%Y-%m-%d').date()
-
-    df_trans = df_trans.loc[
-                                (df_trans['Date']==chosen_date) & \
-                                (df_trans.Param1==float(p1)) & \
-                                (df_trans.Param2==float(p2)) & \
-                                (df_trans.Param3==float(p3))
-                            ]
+transfer_cols = {"State_From": "Origin", "State_To": "Destination", "Num_Units": "Units"}
+
+filter_operators = [
+    ['ge ', '>='],
+    ['le ', '<='],
+    ['lt ', '<'],
+    ['gt ', '>'],
+    ['ne ', '!='],
+    ['eq ', '='],
+    ['contains '],
+]
+
+# Splits one clause of a DataTable filter_query, e.g. "{Units} > 10"
+def split_filter_part(filter_part):
+    for operator_type in filter_operators:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+                return name, operator_type[0].strip(), value
+    return [None] * 3
+
+def filter_transfers(df_trans,filter_query):
+    for filter_part in filter_query.split(' && '):
+        col, operator, value = split_filter_part(filter_part)
+        if col not in df_trans:
+            continue
+        if operator == 'contains':
+            df_trans = df_trans.loc[df_trans[col].astype(str).str.contains(str(value), case=False, regex=False)]
+        elif operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            values = df_trans['Units Value'] if col == 'Units' and isinstance(value, float) else df_trans[col]
+            df_trans = df_trans.loc[getattr(values, operator)(value)]
+    return df_trans
+
+# One page of the transfers table, filtered and sorted on the server so the
+# whole list can be browsed without sending it to the client
+def get_transfers_page(chosen_model,chosen_date,p1,p2,p3,to_or_from,state,page_current,page_size,sort_by,filter_query):
+    df_trans = get_transfers_on(chosen_model,chosen_date,p1,p2,p3)
     if state:
         if to_or_from == "to":
             df_trans = df_trans.loc[df_trans['State_To']==state]
         else:
             df_trans = df_trans.loc[df_trans['State_From']==state]
 
-    df_trans = df_trans[orig_cols]
-    df_trans.columns = final_cols
-    max_rows = 100
-    return html.Table(
-        # Header
-        [html.Tr([html.Th(col) for col in df_trans.columns])] +
-
-        # Body
-        [
-            html.Tr([
-                html.Td(
-                    df_trans.iloc[i][col]) for col in df_trans.columns
-                    ]
-                ) for i in range(min(len(df_trans), max_rows))
-        ],
-        id="transfers-table"
-    )
+    df_trans = df_trans[list(transfer_cols) + ['Units Value']].rename(columns=transfer_cols)
+    if filter_query:
+        df_trans = filter_transfers(df_trans,filter_query)
+    if sort_by:
+        # units are sorted by value, not as text
+        df_trans = df_trans.sort_values(
+            ['Units Value' if s['column_id'] == 'Units' else s['column_id'] for s in sort_by],
+            ascending=[s['direction'] == 'asc' for s in sort_by],
+            kind='mergesort'
+        )
+    page_count = max(1, -(-len(df_trans) // page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    page = df_trans.iloc[page_current*page_size:(page_current+1)*page_size]
+    return page[list(transfer_cols.values())].to_dict('records'), page_count
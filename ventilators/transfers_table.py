@@ -1,6 +1,7 @@
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
+import dash_table
 
 def get_transfers_table():
     models = ["Washington IHME","COVIDAnalytics"]
@@ -38,7 +39,36 @@ def get_transfers_table():
             [
                 dbc.Col(
                     [
-                        html.Div(id='table-container')
+                        html.Div(
+                            dash_table.DataTable(
+                                id='transfers-table',
+                                columns=[{'id': c, 'name': c} for c in ["Origin","Destination","Units"]],
+                                page_action='custom',
+                                page_current=0,
+                                page_size=20,
+                                sort_action='custom',
+                                sort_mode='single',
+                                sort_by=[],
+                                filter_action='custom',
+                                filter_query='',
+                                style_cell={
+                                    'textAlign': 'center',
+                                    'font_size': '14px',
+                                    'font-family': 'arial',
+                                },
+                                style_data_conditional=[
+                                    {
+                                        'if': {'row_index': 'odd'},
+                                        'backgroundColor': 'rgb(248, 248, 248)'
+                                    }
+                                ],
+                                style_header={
+                                    'backgroundColor': 'rgb(230, 230, 230)',
+                                    'fontWeight': 'bold'
+                                },
+                            ),
+                            id='table-container'
+                        )
                     ],
                 ),
             ],
@@ -1,43 +1,155 @@
 import datetime
-import urllib
 import math
+import numpy as np
 import pandas as pd
 from textwrap import wrap
 import plotly.graph_objects as go
 import dash_core_components as dcc
 
 from assets.mappings import get_states, get_colors
+from downloads import get_download_url
+from data_cache import load_cached
+from map_animation import add_date_frames
+
+ventilator_path = 'data/predicted_ventilator/{}-{}.csv'
+supply_cols = ["Shortage","Supply","Demand"]
+param_cols = ["Param1","Param2","Param3"]
+
+# "Washington IHME" or, for anything else, the COVIDAnalytics (ODE) model
+def get_model_key(chosen_model):
+    return 'ihme' if chosen_model == "Washington IHME" else 'ode'
+
+def get_chosen_date(chosen_date):
+    if isinstance(chosen_date, str):
+        return datetime.datetime.strptime(chosen_date, '%Y-%m-%d').date()
+    return chosen_date
+
+def get_params_key(p1,p2,p3):
+    return (float(p1), float(p2), float(p3))
+
+def read_ventilator_table(table, model):
+    df = pd.read_csv(ventilator_path.format(table, model), sep=",", parse_dates = ['Date'])
+    df['Date'] = df['Date'].dt.date
+    return df
+
+# Rows of a transfers table for one (Param1, Param2, Param3), also split by Date
+def build_transfers_partition(df):
+    return {
+        'df': df,
+        'dates': dict(tuple(df.groupby('Date'))),
+    }
+
+# Rows of a state supplies table for one (Param1, Param2, Param3): the US totals,
+# the states split by Date and the largest state values over all dates
+def build_supplies_partition(df):
+    states = df.loc[df['State']!='US']
+    return {
+        'df': df,
+        'us': df.loc[df['State']=='US'],
+        'dates': dict(tuple(states.groupby('Date'))),
+        'max': states[supply_cols].max().to_dict(),
+        'empty': states.iloc[:0],
+    }
+
+def build_ventilator_store(df, build_partition):
+    return {
+        'df': df,
+        'params': [df[c].unique() for c in param_cols],
+        'min_date': min(df.Date.values),
+        'max_date': max(df.Date.values),
+        'partitions': {
+            tuple(float(v) for v in key): build_partition(part)
+            for key, part in df.groupby(param_cols)
+        },
+    }
+
+# Each table is read and partitioned once per worker, and again when its file
+# changes; callbacks then look their rows up instead of filtering the table
+def get_ventilator_store(table, model, build_partition):
+    return load_cached(
+        'ventilators {} {}'.format(table, model),
+        ventilator_path.format(table, model),
+        lambda: build_ventilator_store(read_ventilator_table(table, model), build_partition)
+    )
+
+def read_transfers_table(model):
+    df = read_ventilator_table('transfers_table', model)
+    # small transfers are reported as "<5"; they sort just below 5
+    units = df['Num_Units'].astype(str)
+    df['Units Value'] = pd.to_numeric(units.str.lstrip('<'), errors='coerce') - 0.5*units.str.startswith('<')
+    return df
+
+def get_transfers_store(model):
+    return load_cached(
+        'ventilators transfers_table {}'.format(model),
+        ventilator_path.format('transfers_table', model),
+        lambda: build_ventilator_store(read_transfers_table(model), build_transfers_partition)
+    )
+
+# shortages before any transfer, the same for every parameter choice
+def get_baseline_store(model):
+    return get_ventilator_store('state_supplies_table_baseline', model, build_supplies_partition)
+
+# shortages once the optimized transfers are made
+def get_optimized_store(model):
+    return get_ventilator_store('state_supplies_table', model, build_supplies_partition)
+
+def get_baseline(model):
+    return next(iter(get_baseline_store(model)['partitions'].values()))
+
+# US shortage before and after the optimized transfers for every parameter
+# choice, on the baseline's dates (NaN where the optimization has no value)
+def build_shortage_effect(model):
+    baseline = get_baseline(model)['us']
+    optimized = get_optimized_store(model)['partitions']
+    dates = baseline['Date'].values
+    day_index = {d: i for i, d in enumerate(dates)}
+    values = np.full((len(optimized), len(dates)), np.nan)
+    for i, partition in enumerate(optimized.values()):
+        us = partition['us']
+        days = [day_index.get(d) for d in us['Date']]
+        known = [j for j, day in enumerate(days) if day is not None]
+        values[i, [days[j] for j in known]] = us['Shortage'].values[known]
+    return {
+        'dates': dates,
+        'baseline': baseline['Shortage'].values.astype(float),
+        'optimized': values,
+        'params': {key: i for i, key in enumerate(optimized)},
+    }
+
+def get_shortage_effect(model):
+    return load_cached(
+        'ventilators shortage effect {}'.format(model),
+        [ventilator_path.format('state_supplies_table_baseline', model), ventilator_path.format('state_supplies_table', model)],
+        lambda: build_shortage_effect(model)
+    )
+
+# Builds the stores and shortage series of both models, skipping missing files
+def warm_ventilator_stores():
+    for model in ['ihme', 'ode']:
+        try:
+            get_transfers_store(model)
+            get_shortage_effect(model)
+        except OSError:
+            pass
 
 def get_df_mod1_transfers(params=False):
-    df = pd.read_csv('data/predicted_ventilator/transfers_table-ihme.csv', sep=",", parse_dates = ['Date'])
-    df.loc[:,'Date'] = pd.to_datetime(df['Date'], format='y%m%d').dt.date
+    store = get_transfers_store('ihme')
     if params:
-        p1 = df.Param1.unique()
-        p2 = df.Param2.unique()
-        p3 = df.Param3.unique()
-        min_date = min(df.Date.values)
-        max_date = max(df.Date.values)
-        return df, [p1, p2, p3, min_date, max_date]
-    return df, None
+        return store['df'], store['params'] + [store['min_date'], store['max_date']]
+    return store['df'], None
 
 def get_df_mod2_transfers():
-    df = pd.read_csv('data/predicted_ventilator/transfers_table-ode.csv', sep=",", parse_dates = ['Date'])
-    df.loc[:,'Date'] = pd.to_datetime(df['Date'], format='y%m%d').dt.date
-    return df
+    return get_transfers_store('ode')['df']
 
 def get_df_mod1_projections(params=False):
-    df = pd.read_csv('data/predicted_ventilator/state_supplies_table_baseline-ihme.csv', sep=",", parse_dates = ['Date'])
-    df.loc[:,'Date'] = pd.to_datetime(df['Date'], format='y%m%d').dt.date
+    store = get_baseline_store('ihme')
     if params:
-        min_shortage_date = min(df.Date.values)
-        max_shortage_date = max(df.Date.values)
-        return df, [min_shortage_date,max_shortage_date]
-    return df, None
+        return store['df'], [store['min_date'], store['max_date']]
+    return store['df'], None
 
 def get_df_mod2_projections():
-    df = pd.read_csv('data/predicted_ventilator/state_supplies_table_baseline-ode.csv', sep=",", parse_dates = ['Date'])
-    df.loc[:,'Date'] = pd.to_datetime(df['Date'], format='y%m%d').dt.date
-    return df
+    return get_baseline_store('ode')['df']
 
 def get_first_date():
     return datetime.date(2020, 4, 15)
@@ -59,16 +171,14 @@ def get_model_visual():
 def change2Percent(frac):
     return str(math.floor(100*frac))+'%'
 
-def us_map(df,chosen_date,val,label_dict):
-    if isinstance(chosen_date, str):
-        chosen_date = datetime.datetime.strptime(chosen_date, '%Y-%m-%d').date()
+def us_map(partition,chosen_date,val,label_dict):
+    chosen_date = get_chosen_date(chosen_date)
 
-    max_val = max(df.loc[df['State']!='US'][val])
+    max_val = partition['max'][val]
     if max_val == 0:
         max_val = 500
 
-    df = df.loc[df['Date']==chosen_date]
-    df = df.loc[df['State']!='US']
+    df = partition['dates'].get(chosen_date, partition['empty'])
     df = df.applymap(str)
 
     states = get_states()
@@ -112,6 +222,57 @@ def us_map(df,chosen_date,val,label_dict):
     )
     return graph
 
+# Every date of a partition as one animated map, with the same color scale,
+# hover text and title as us_map
+def us_map_animation(partition,val,label_dict):
+    max_val = partition['max'][val]
+    if max_val == 0:
+        max_val = 500
+
+    dates = sorted(partition['dates'])
+    if not dates:
+        return None
+    states = get_states()
+    codes = pd.Series(sorted(set().union(*[partition['dates'][d]['State'] for d in dates])))
+
+    fig = go.Figure(data=go.Choropleth(
+            locations=codes.map(states),
+            locationmode='USA-states',
+            colorscale='Inferno_r',
+            zmin = 0,
+            zmax = max_val,
+            autocolorscale=False,
+            marker_line_color='white', # line markers between states
+            colorbar_title='<br>'.join(wrap(''.join([label_dict[val]]), width=10)),
+        ))
+    fig.update_layout(
+            geo = dict(
+                scope='usa',
+                projection=go.layout.geo.Projection(type = 'albers usa'),
+                showlakes=True, # lakes
+                lakecolor='rgb(255, 255, 255)'
+            ),
+        )
+
+    frames = []
+    for chosen_date in dates:
+        df = partition['dates'][chosen_date].set_index('State')[supply_cols]
+        text = df.applymap(str).reindex(codes).fillna('')
+        df = df.reindex(codes)
+        text = codes.values + '<br>' + \
+                'Shortage ' + text['Shortage'] + '<br>' + \
+                'Supply ' + text['Supply'] + '<br>' + \
+                'Demand ' + text['Demand']
+        title = '{} on {}'.format(label_dict[val], chosen_date.strftime('%b %d, %Y'))
+        frames.append((
+            chosen_date.strftime('%Y-%m-%d'),
+            chosen_date.strftime('%b %d'),
+            df[val].astype(float).values,
+            text.values,
+            '<br>'.join(wrap(''.join(['<b> ', title, ' </b>']), width=26)),
+        ))
+    return add_date_frames(fig, frames)
+
 def us_timeline(df, title, with_opt):
 
     fig = go.Figure()
@@ -191,19 +352,10 @@ def us_timeline(df, title, with_opt):
 
 def build_download_link_demand(chosen_model):
     if chosen_model == "Washington IHME":
-        df_shortage = pd.read_csv('data/predicted_ventilator/state_supplies_table-ihme.csv', sep=",", parse_dates = ['Date'])
-    else:
-        df_shortage = pd.read_csv('data/predicted_ventilator/state_supplies_table-ode.csv', sep=",", parse_dates = ['Date'])
-    df_shortage = df_shortage.to_csv(index=False, encoding='utf-8')
-    state_csv_string = "data:text/csv;charset=utf-8," + urllib.parse.quote(df_shortage)
-    return state_csv_string
+        return get_download_url('covid_analytics_ventilator_demand_ihme.csv')
+    return get_download_url('covid_analytics_ventilator_demand_ode.csv')
 
 def build_download_link_transfers(chosen_model):
-    df_mod1_transfers, _ = get_df_mod1_transfers()
-    df_mod2_transfers = get_df_mod2_transfers()
     if chosen_model == "Washington IHME":
-        transfers_csv_string = df_mod1_transfers.to_csv(index=False, encoding='utf-8')
-    else:
-        transfers_csv_string = df_mod1_transfers.to_csv(index=False, encoding='utf-8')
-    transfers_csv_string = "data:text/csv;charset=utf-8," + urllib.parse.quote(transfers_csv_string)
-    return transfers_csv_string
+        return get_download_url('covid_analytics_ventilator_transfers_ihme.csv')
+    return get_download_url('covid_analytics_ventilator_transfers_ode.csv')